@@ -4,10 +4,14 @@ Flask API server for Food-Friend
 Connects the React frontend with the LLM-based matching logic
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context, g
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import os
 import json
+import time
+import hashlib
+import threading
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -16,72 +20,140 @@ load_dotenv()
 APP_NAME = os.getenv('APP_NAME', 'Food Friend')
 APP_VERSION = os.getenv('APP_VERSION', '1.0.0')
 
-from llm_utils_updated import load_llm, extract_food_choices
-from llm_hybrid_matcher import llm_hybrid_match
+from llm_utils_updated import load_llm, load_embedder, embed_texts
+from food_extraction import get_food_extractor
+from llm_hybrid_matcher import llm_hybrid_match_iter, embedding_hybrid_match_many
+from llm_full_matcher import cached_match_reason, llm_match_reason
+from embeddings import get_taste_embedder
+from config import (
+    SEMANTIC_SCORING, CANDIDATE_SEARCH, USERS_PAGE_BATCH, MATCH_RESULTS, TOPK_SIZE,
+)
+from user_store import get_user_store, user_key
+from match_engine import FeatureMatrix, valid_profile, score_many
+from match_topk import TopKTable
+from match_cache import MatchResultCache, scoring_version
+from taste_index import TasteIndex
+from match_jobs import MatchJobManager
+from llm_pool import LLMPool, LLMPoolTimeout
+import metrics
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """jsonify() that records JSON serialization as a request stage"""
+
+    def response(self, *args, **kwargs):
+        with metrics.stage("serialize"):
+            return super().response(*args, **kwargs)
+
 
 app = Flask(__name__)
-CORS(app)  # Enable CORS for React frontend
+app.json = TimedJSONProvider(app)
+CORS(app, expose_headers=["Server-Timing", "ETag"])  # Enable CORS for React frontend
 
-DATA_DIR = "data/users"
-os.makedirs(DATA_DIR, exist_ok=True)
+# Profiles are loaded once and re-read only when they change
+# (JSON files or SQLite, per USER_STORE_BACKEND)
+user_store = get_user_store()
 
-# Load LLM once at startup
-print("🔄 Loading LLM model...")
-try:
-    llm = load_llm()
-    print("✅ LLM loaded successfully!")
-    print(f"   Model ready for inference")
-except Exception as e:
-    print(f"❌ Failed to load LLM: {e}")
-    print("   Server will start but matching will fail")
-    llm = None
+# Every user's match features as NumPy arrays; follows store changes
+population = FeatureMatrix()
 
+# Food item embeddings (cached on disk per item) for taste vectors and the
+# semantic tier
+taste_embedder = get_taste_embedder()
 
-def user_file_by_name(name):
-    """Get user file path by name"""
-    safe = name.replace(" ", "_").lower()
-    return os.path.join(DATA_DIR, f"user_{safe}.json")
+# Taste vectors in an ANN index, so candidate search scans nearby
+# profiles instead of the whole population
+taste_index = TasteIndex(taste_embedder) if CANDIDATE_SEARCH == "ann" else None
 
+# Each user's top-5 candidates and last hybrid matches, patched per profile
+# change instead of recomputed per request
+topk = TopKTable(population, index=taste_index)
 
-def load_user_by_name(name):
-    """Load user data by name"""
-    path = user_file_by_name(name)
-    if os.path.exists(path):
-        with open(path) as f:
-            return json.load(f)
-    return None
+# The three above are filled from the store in the background so every
+# endpoint serves right after boot; until then the Python pass scans the
+# store directly
+indexes_ready = threading.Event()
 
 
-def save_user_json(data):
-    """Save user JSON file"""
-    with open(user_file_by_name(data["name"]), "w") as f:
-        json.dump(data, f, indent=2)
+def build_indexes():
+    start = time.perf_counter()
+    population.attach(user_store)
+    if taste_index is not None:
+        taste_index.attach(user_store)
+    topk.attach(user_store)
+    indexes_ready.set()
+    print(f"🧮 Match indexes ready in {time.perf_counter() - start:.1f}s")
 
 
-def load_all_users(exclude=None):
-    """Load all users except the specified one"""
-    users = []
-    for fname in os.listdir(DATA_DIR):
-        if not fname.endswith(".json"):
-            continue
-        
-        path = os.path.join(DATA_DIR, fname)
-        try:
-            with open(path) as f:
-                data = json.load(f)
-            
-            if "name" not in data:
-                continue
-            
-            if exclude and data["name"].lower() == exclude.lower():
-                continue
-            
-            data.setdefault("foodChoices", [])
-            users.append(data)
-        except:
-            continue
-    
-    return users
+threading.Thread(target=build_indexes, name="build-indexes", daemon=True).start()
+
+# Last calculate-matches result per user, valid until the population or
+# the scoring setup changes
+match_cache = MatchResultCache()
+
+# Descriptions are parsed by rules first; the LLM only sees the hard ones
+food_extractor = get_food_extractor()
+
+# Background workers for /api/match-jobs
+match_jobs = MatchJobManager()
+
+# LLM workers load in the background (retrying on failure) so non-LLM
+# endpoints serve immediately; each request checks one worker out
+llm_pool = LLMPool()
+print(f"🔄 Loading {llm_pool.size} LLM worker(s) in the background...")
+llm_pool.load_in_background(load_llm)
+
+# The embedding-mode model gets its own single-instance pool
+embedding_pool = LLMPool(size=1)
+if SEMANTIC_SCORING == "embedding":
+    embedding_pool.load_in_background(load_embedder)
+
+LLM_NOT_READY = "LLM is still loading. Please try again shortly."
+
+metrics.gauge("foodfriend_users", "Profiles in the user store", lambda: len(user_store))
+metrics.gauge("foodfriend_llm_workers_busy", "LLM workers checked out",
+              lambda: llm_pool.metrics()["busy"])
+metrics.gauge("foodfriend_llm_queue_depth", "Requests waiting for an LLM worker",
+              lambda: llm_pool.metrics()["queueDepth"])
+
+
+@app.before_request
+def start_timing():
+    g.request_start = time.perf_counter()
+    metrics.begin_request()
+
+
+@app.after_request
+def add_server_timing(response):
+    """Per-stage breakdown for browser devtools, plus request histograms"""
+    total = time.perf_counter() - g.request_start
+    metrics.HTTP_SECONDS.observe(total, request.url_rule.rule if request.url_rule else "unmatched",
+                                 response.status_code)
+    response.headers["Server-Timing"] = metrics.server_timing(metrics.request_stages(), total)
+    return response
+
+
+@app.errorhandler(LLMPoolTimeout)
+def llm_pool_timeout(e):
+    """Every LLM worker stayed busy for the whole checkout timeout"""
+    return jsonify({"error": "All LLM workers are busy. Please try again."}), 503
+
+
+def load_user_by_name(name):
+    """Load user data by name"""
+    with metrics.stage("users"):
+        return user_store.get(name)
+
+
+def save_user_json(data, coalesce=False):
+    """
+    Save user JSON file. With `coalesce`, the write is deferred briefly so
+    a burst of edits from one client becomes a single write.
+    """
+    if coalesce:
+        user_store.save_later(data)
+    else:
+        user_store.save(data)
 
 
 @app.route('/api/login', methods=['POST'])
@@ -128,6 +200,9 @@ def update_foods():
     if not name:
         return jsonify({"error": "Name is required"}), 400
     
+    if not isinstance(food_choices, list) or not all(isinstance(f, str) for f in food_choices):
+        return jsonify({"error": "foodChoices must be a list of strings"}), 400
+    
     user = load_user_by_name(name)
     
     if not user:
@@ -135,7 +210,8 @@ def update_foods():
     
     user['foodChoices'] = food_choices
     user['lastUpdated'] = datetime.now().isoformat()
-    save_user_json(user)
+    # The frontend posts on every add/remove; coalesce the burst
+    save_user_json(user, coalesce=True)
     
     return jsonify({
         "success": True,
@@ -145,7 +221,10 @@ def update_foods():
 
 @app.route('/api/extract-foods', methods=['POST'])
 def extract_foods():
-    """Extract food choices from natural language description using LLM"""
+    """
+    Extract food choices from natural language description.
+    Cached or rule-parseable descriptions are answered without the LLM.
+    """
     data = request.json
     description = data.get('description', '').strip()
     
@@ -153,97 +232,508 @@ def extract_foods():
         return jsonify({"error": "Description is required"}), 400
     
     try:
-        choices = extract_food_choices(llm, description)
+        choices = food_extractor.quick_extract(description)
+        if choices is None:
+            if not llm_pool.ready:
+                return jsonify({"error": LLM_NOT_READY}), 503
+            with llm_pool.checkout() as llm:
+                choices = food_extractor.llm_extract(llm, description)
         return jsonify({
             "success": True,
-            "foodChoices": choices if isinstance(choices, list) else []
+            "foodChoices": choices
         })
+    except LLMPoolTimeout:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.route('/api/calculate-matches', methods=['POST'])
-def calculate_matches():
-    """Calculate compatibility matches for a user"""
-    data = request.json
-    name = data.get('name', '').strip()
+def _match_request_user(name):
+    """
+    Validate a match request and return (user, None),
+    or (None, (error message, status)) when it can't be matched
+    """
+    name = name.strip()
     
     if not name:
-        return jsonify({"error": "Name is required"}), 400
+        return None, ("Name is required", 400)
     
     user = load_user_by_name(name)
     
     if not user:
-        return jsonify({"error": "User not found"}), 404
+        return None, ("User not found", 404)
+    
+    if not valid_profile(user):
+        return None, ("Profile has malformed food preferences", 400)
     
     if not user.get('foodChoices'):
-        return jsonify({"error": "No food preferences set"}), 400
+        return None, ("No food preferences set", 400)
     
-    # Load other users
-    others = load_all_users(exclude=name)
+    return user, None
+
+
+def python_pass(user):
+    """
+    First pass: Quick Python-only scoring, keeping the top 5 candidates for
+    full LLM analysis. Read from the top-k table, which is kept current as
+    profiles change (a full scan of the store while it is being built).
+    """
+    with metrics.stage("python_pass"):
+        if not indexes_ready.is_set():
+            others = [u for u in user_store.all_users() if valid_profile(u)]
+            return score_many(user, others, TOPK_SIZE)
+        return topk.candidates(user_key(user["name"]), user)
+
+
+def python_matches(top_candidates):
+    """Python-pass candidates in the response format (no LLM fields yet)"""
+    return [{
+        "name": other["name"],
+        "score": py_result["score"],
+        "sharedFoods": py_result["shared_exact"],
+        "matchedCuisines": py_result["matched_cuisines"],
+        "keywordHits": py_result["keyword_hits"],
+        "llmReason": "",
+        "pythonScore": py_result["score"],
+        "llmScore": None
+    } for other, py_result in top_candidates]
+
+
+def hybrid_match(other, scoreinfo):
+    """One hybrid (Python + LLM or embedding) result in the response format"""
+    return {
+        "name": other["name"],
+        "score": scoreinfo["final_score"],
+        "sharedFoods": scoreinfo.get("shared_exact", []),
+        "matchedCuisines": scoreinfo.get("matched_cuisines", []),
+        "keywordHits": scoreinfo.get("keyword_hits", []),
+        "llmReason": scoreinfo.get("reason", ""),
+        "pythonScore": scoreinfo.get("python_score", 0),
+        "llmScore": scoreinfo.get("llm_score"),
+        "embeddingScore": scoreinfo.get("embedding_score")
+    }
+
+
+def embed_items(items):
+    """Embed unseen food items, or None while the embedding model loads"""
+    if not embedding_pool.ready:
+        return None
+    with embedding_pool.checkout() as llm:
+        return embed_texts(llm, items)
+
+
+def use_embeddings():
+    return SEMANTIC_SCORING == "embedding" and embedding_pool.ready
+
+
+def semantic_ready():
+    """True when the second pass can run (either tier loaded)"""
+    return use_embeddings() or llm_pool.ready
+
+
+def semantic_pass_iter(user, top_candidates):
+    """
+    (index, hybrid scoreinfo) per top candidate: from the embedding tier
+    when it is configured and loaded, else from one batched LLM prompt
+    """
+    if use_embeddings():
+        with metrics.stage("embedding_pass"):
+            scoreinfos = embedding_hybrid_match_many(
+                taste_embedder, user, top_candidates, embed_items)
+        yield from enumerate(scoreinfos)
+        return
+    with llm_pool.checkout() as llm:
+        yield from llm_hybrid_match_iter(llm, user, top_candidates)
+
+
+def llm_pass(user, top_candidates):
+    """
+    Second pass: Full hybrid scoring on top candidates only (embedding
+    similarity, or all candidates sharing one batched LLM prompt).
+    Returns the top MATCH_RESULTS and stores them in the top-k table when
+    every semantic score arrived.
+    """
+    print(f"🔍 Analyzing top {len(top_candidates)} candidates...")
+    results = [
+        hybrid_match(top_candidates[i][0], scoreinfo)
+        for i, scoreinfo in semantic_pass_iter(user, top_candidates)
+    ]
+    print(f"✅ Completed analysis")
     
-    if not others:
-        return jsonify({
+    # Sort by score descending
+    results.sort(key=lambda x: x["score"], reverse=True)
+    results = results[:MATCH_RESULTS]  # Top matches
+    _store_matches(user, top_candidates, results)
+    return results
+
+
+def _complete(results):
+    """True unless some match's semantic score fell back to the Python score"""
+    return all(match["llmScore"] is not None or match["embeddingScore"] is not None
+               for match in results)
+
+
+def _store_matches(user, top_candidates, results):
+    """Keep final matches in the top-k table unless a semantic score fell back"""
+    if _complete(results) and indexes_ready.is_set():
+        topk.store_matches(user_key(user["name"]), user, top_candidates, results,
+                           current_scoring_version())
+
+
+def stored_matches(user):
+    """Final matches from the top-k table if nothing changed since, else None"""
+    with metrics.stage("stored_matches"):
+        if not indexes_ready.is_set():
+            return None
+        return topk.matches(user_key(user["name"]), user, current_scoring_version())
+
+
+def current_scoring_version():
+    """scoring_version of the semantic tier serving right now"""
+    return scoring_version("embedding" if use_embeddings() else "llm")
+
+
+def match_cache_version():
+    """
+    Validity token for cached results: population state + scoring setup
+    (+ whether the Python pass still falls back to a full scan)
+    """
+    user_store.refresh()
+    return (user_store.version, current_scoring_version(), indexes_ready.is_set())
+
+
+def _cache_matches(user, version, matches):
+    """Cache complete matches under `version`; returns their ETag (None if not cached)"""
+    if not _complete(matches):
+        return None
+    return match_cache.put(user_key(user["name"]), version, user.get("lastUpdated"), matches)
+
+
+def _matches_response(matches, etag=None):
+    """Matches as JSON, or 304 when the client already holds this ETag"""
+    if etag is not None and request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify({
             "success": True,
-            "matches": []
+            "matches": matches
         })
+    if etag is not None:
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+@app.route('/api/calculate-matches', methods=['GET', 'POST'])
+def calculate_matches():
+    """
+    Calculate compatibility matches for a user (JSON body, or ?name= for
+    GET). Results are cached per user until the population or scoring
+    setup changes; send If-None-Match with the ETag to get a 304.
+    """
+    if request.method == 'GET':
+        name = request.args.get('name', '')
+    else:
+        name = request.json.get('name', '')
     
-    # Calculate scores using hybrid matcher (Python + LLM)
-    # Performance optimization: Only use expensive LLM scoring on top Python matches
-    
-    # Check if LLM is loaded
-    if llm is None:
-        return jsonify({"error": "LLM not loaded. Please restart the server."}), 500
-    
-    results = []
-    
-    # First pass: Quick Python-only scoring
-    from match_engine import score_pair
-    quick_scores = []
-    for other in others:
-        py_score = score_pair(user, other)
-        quick_scores.append((other, py_score))
-    
-    # Sort and take top 5 candidates for full LLM analysis
-    quick_scores.sort(key=lambda x: x[1]["score"], reverse=True)
-    top_candidates = quick_scores[:5]
-    
-    # Second pass: Full hybrid scoring on top candidates only
-    print(f"🔍 Analyzing top {len(top_candidates)} candidates with LLM...")
-    for other, py_result in top_candidates:
-        scoreinfo = llm_hybrid_match(llm, user, other)
-        results.append({
-            "name": other["name"],
-            "score": scoreinfo["final_score"],
-            "sharedFoods": scoreinfo.get("shared_exact", []),
-            "matchedCuisines": scoreinfo.get("matched_cuisines", []),
-            "keywordHits": scoreinfo.get("keyword_hits", []),
-            "llmReason": scoreinfo.get("reason", ""),
-            "pythonScore": scoreinfo.get("python_score", 0),
-            "llmScore": scoreinfo.get("llm_score", 0)
-        })
-    print(f"✅ Completed analysis")
+    # Nothing changed since the last calculation → answer from memory.
+    # The version is taken first, so a result computed while the
+    # population changes is cached under the already outdated version.
+    version = match_cache_version()
+    cached = match_cache.get(user_key(name.strip()), version)
+    if cached is not None:
+        etag, matches = cached
+        return _matches_response(matches, etag)
     
-    # Sort by score descending
-    results.sort(key=lambda x: x["score"], reverse=True)
+    user, error = _match_request_user(name)
+    if error:
+        return jsonify({"error": error[0]}), error[1]
+    
+    # Unchanged user and candidates → last computed matches
+    matches = stored_matches(user)
+    if matches is None:
+        top_candidates = python_pass(user)
+        
+        if not top_candidates:
+            matches = []
+        else:
+            # Calculate scores using hybrid matcher (Python + LLM)
+            # Performance optimization: Only use expensive LLM scoring on top Python matches
+            
+            # Check if LLM (or the embedding tier) is loaded
+            if not semantic_ready():
+                return jsonify({"error": LLM_NOT_READY}), 503
+            
+            matches = llm_pass(user, top_candidates)
+    
+    return _matches_response(matches, _cache_matches(user, version, matches))
+
+
+def _sse(event, data):
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route('/api/calculate-matches/stream', methods=['GET'])
+def calculate_matches_stream():
+    """
+    Progressive variant of calculate-matches over Server-Sent Events:
+      ranking  Python-pass ranking, sent as soon as it is computed
+      refined  one hybrid result per candidate as its semantic score arrives
+      done     final top 3 (same as calculate-matches)
+      error    request could not be matched
+    Results cached by calculate-matches (or stored in the top-k table) are
+    sent right away as a single done event.
+    """
+    name = request.args.get('name', '')
+    version = match_cache_version()
+    cached = match_cache.get(user_key(name.strip()), version)
+    user, error = (None, None) if cached is not None else _match_request_user(name)
+    
+    def events():
+        if cached is not None:
+            yield _sse("done", {"matches": cached[1]})
+            return
+        
+        if error:
+            yield _sse("error", {"error": error[0]})
+            return
+        
+        matches = stored_matches(user)
+        if matches is not None:
+            _cache_matches(user, version, matches)
+            yield _sse("done", {"matches": matches})
+            return
+        
+        top_candidates = python_pass(user)
+        yield _sse("ranking", {"matches": python_matches(top_candidates)})
+        
+        if not top_candidates:
+            _cache_matches(user, version, [])
+            yield _sse("done", {"matches": []})
+            return
+        
+        if not semantic_ready():
+            yield _sse("error", {"error": LLM_NOT_READY})
+            return
+        
+        print(f"🔍 Streaming top {len(top_candidates)} candidates...")
+        results = []
+        try:
+            for i, scoreinfo in semantic_pass_iter(user, top_candidates):
+                match = hybrid_match(top_candidates[i][0], scoreinfo)
+                results.append(match)
+                yield _sse("refined", {"match": match})
+        except LLMPoolTimeout:
+            yield _sse("error", {"error": "All LLM workers are busy. Please try again."})
+            return
+        print(f"✅ Completed analysis")
+        
+        results.sort(key=lambda x: x["score"], reverse=True)
+        matches = results[:MATCH_RESULTS]
+        _store_matches(user, top_candidates, matches)
+        _cache_matches(user, version, matches)
+        yield _sse("done", {"matches": matches})
+    
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route('/api/match-jobs', methods=['POST'])
+def create_match_job():
+    """Start matching in the background and return a job ID to poll"""
+    user, error = _match_request_user(request.json.get('name', ''))
+    if error:
+        return jsonify({"error": error[0]}), error[1]
+    
+    if not semantic_ready():
+        return jsonify({"error": LLM_NOT_READY}), 503
+    
+    def run(job):
+        matches = stored_matches(user)
+        if matches is not None:
+            return matches
+        top_candidates = python_pass(user)
+        job.partial = python_matches(top_candidates)
+        if not top_candidates:
+            return []
+        return llm_pass(user, top_candidates)
+    
+    # Same user and profile version → share the job already in progress
+    key = (user["name"].lower(), user.get("lastUpdated"), tuple(user["foodChoices"]))
+    job, created = match_jobs.submit(key, run)
+    
+    return jsonify({"success": True, **job.to_dict()}), 202 if created else 200
+
+
+@app.route('/api/match-jobs/<job_id>', methods=['GET'])
+def get_match_job(job_id):
+    """Status, partial results and final results of a match job"""
+    job = match_jobs.get(job_id)
+    
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    
+    return jsonify({"success": True, **job.to_dict()})
+
+
+@app.route('/api/match-reason', methods=['GET'])
+def match_reason():
+    """
+    Why users `a` and `b` match, for a match card the user expands.
+    Scoring leaves reasons out (MATCH_REASONS = "lazy"); a pair's reason is
+    generated on its first request and cached by food lists after that.
+    """
+    users = []
+    for param in ('a', 'b'):
+        user, error = _match_request_user(request.args.get(param, ''))
+        if error:
+            return jsonify({"error": error[0]}), error[1]
+        users.append(user)
+    
+    reason = cached_match_reason(*users)
+    if reason is None:
+        if not llm_pool.ready:
+            return jsonify({"error": LLM_NOT_READY}), 503
+        with llm_pool.checkout() as llm:
+            reason = llm_match_reason(llm, *users)
+    
+    if reason is None:
+        return jsonify({"error": "Failed to generate a match reason"}), 500
     
     return jsonify({
         "success": True,
-        "matches": results[:3]  # Return top 3 matches
+        "reason": reason
     })
 
 
-@app.route('/api/users', methods=['GET'])
-def get_users():
-    """Get all users"""
-    users = load_all_users()
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the process is up and serving requests"""
+    return jsonify({"status": "ok"})
+
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: at least one LLM worker is loaded and the match indexes are built"""
+    ready = llm_pool.ready and indexes_ready.is_set()
+    return jsonify({
+        "status": "ready" if ready else "loading",
+        "indexesReady": indexes_ready.is_set(),
+        "workers": llm_pool.loaded,
+        "size": llm_pool.size,
+        "lastLoadError": llm_pool.last_error
+    }), 200 if ready else 503
+
+
+@app.route('/api/llm-pool', methods=['GET'])
+def get_llm_pool():
+    """LLM worker pool metrics: busy/idle workers, queue depth, wait times"""
+    return jsonify({
+        "success": True,
+        "pool": llm_pool.metrics(),
+        "embeddingPool": embedding_pool.metrics(),
+        "embeddedItems": len(taste_embedder.cache)
+    })
+
+
+@app.route('/api/extract-foods/stats', methods=['GET'])
+def get_extraction_stats():
+    """Food extraction counters: cache hits, rule hits and LLM calls"""
     return jsonify({
         "success": True,
-        "users": users
+        "extraction": food_extractor.stats()
     })
 
 
+@app.route('/api/match-stats', methods=['GET'])
+def get_match_stats():
+    """Match serving counters: top-k table, taste index and result cache"""
+    return jsonify({
+        "success": True,
+        "topk": topk.stats(),
+        "tasteIndex": taste_index.stats() if taste_index is not None else None,
+        "matchCache": match_cache.stats()
+    })
+
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Stage latency, LLM token and request histograms (Prometheus text format)"""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route('/api/users', methods=['GET'])
+def get_users():
+    """
+    Get users ordered by name, streamed in chunks.
+
+    Query parameters:
+      limit   page size (every user when omitted)
+      after   cursor: the previous page's nextCursor
+      fields  comma-separated projection, e.g. fields=name
+    The ETag follows the store's version, so an unchanged page gets 304
+    from any server worker.
+    """
+    limit = request.args.get('limit')
+    if limit is not None:
+        if not limit.isdigit() or int(limit) < 1:
+            return jsonify({"error": "limit must be a positive integer"}), 400
+        limit = int(limit)
+    after = request.args.get('after') or None
+    fields = [f for f in request.args.get('fields', '').split(',') if f] or None
+
+    # Taken before reading any profile: a page that changes meanwhile is
+    # sent with an already outdated tag, never a stale page with a new one
+    with metrics.stage("users"):
+        user_store.refresh()
+    etag = hashlib.sha256(json.dumps(
+        [user_store.version, limit, after, fields]
+    ).encode("utf-8")).hexdigest()[:32]
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+
+    def project(user):
+        return {f: user[f] for f in fields if f in user} if fields else user
+
+    def chunks():
+        yield '{"success": true, "users": ['
+        cursor, remaining, sep = after, limit, ""
+        while remaining is None or remaining > 0:
+            batch = USERS_PAGE_BATCH if remaining is None else min(USERS_PAGE_BATCH, remaining)
+            users, cursor = user_store.page(cursor, batch)
+            if users:
+                yield sep + ",".join(app.json.dumps(project(u)) for u in users)
+                sep = ","
+            if remaining is not None:
+                remaining -= len(users)
+            if cursor is None:
+                break
+        yield '], "nextCursor": ' + app.json.dumps(cursor) + '}'
+
+    return Response(chunks(), mimetype="application/json", headers=headers)
+
+
+def shutdown(timeout=None):
+    """
+    Drain before the process exits (called by gunicorn's worker_exit hook):
+    queued match jobs are cancelled, running ones and in-flight LLM calls
+    get up to `timeout` seconds, then no new LLM checkouts are allowed.
+    Pending profile writes and the taste index are saved at exit.
+    """
+    print(f"🛑 Draining (up to {timeout}s)...")
+    deadline = None if timeout is None else time.monotonic() + timeout
+    drained = match_jobs.shutdown(timeout)
+    for pool in (llm_pool, embedding_pool):
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        drained = pool.close(remaining) and drained
+    print("✅ Drained" if drained else "⚠️ Timed out with LLM work still running")
+    return drained
+
+
 if __name__ == '__main__':
     print(f"\n🍕 {APP_NAME} API Server v{APP_VERSION}")
     print("=" * 50)
+    print("Development server; for production run: gunicorn -c gunicorn.conf.py api_server:app")
     app.run(host='0.0.0.0', port=5000, debug=True)
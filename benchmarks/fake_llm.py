@@ -0,0 +1,114 @@
+# benchmarks/fake_llm.py
+"""
+Deterministic stand-in for llama_cpp.Llama
+
+Answers the repo's prompts (extraction, the full, score-only and reason
+match prompts, single and batched, and SCORING_PROMPT) in the format the
+real model is asked for, with scores
+derived from a hash of the food lists, and sleeps a configurable time per
+prompt and per generated token. embed() returns bag-of-words vectors hashed
+from each text, so items sharing words come out similar. Benchmarks can then
+run every LLM code path without a model file.
+"""
+
+import re
+import time
+import hashlib
+
+import numpy as np
+
+_BATCH_LINE = re.compile(r"^(\d+): (.*)$", re.M)
+_LIKES = re.compile(r"^(?:User|Person) [AB] likes: (.*)$", re.M)
+
+
+def fake_score(foods_a, foods_b):
+    """Stable 0-100 score for a pair of food lists (order-independent)"""
+    pair = "|".join(sorted([foods_a.lower(), foods_b.lower()]))
+    return int(hashlib.sha1(pair.encode("utf-8")).hexdigest(), 16) % 101
+
+
+class FakeLlama:
+    """
+    Callable like a Llama instance: llm(prompt, max_tokens=..., stream=...).
+    A "token" is `chars_per_token` characters of the answer.
+    """
+
+    def __init__(self, token_latency=0.0, prompt_token_latency=0.0, chars_per_token=4,
+                 embedding_dim=64):
+        self.token_latency = token_latency
+        self.prompt_token_latency = prompt_token_latency
+        self.chars_per_token = chars_per_token
+        self.embedding_dim = embedding_dim
+        self.calls = 0
+        self.completion_tokens = 0
+
+    def tokenize(self, data):
+        return list(range(max(1, len(data) // self.chars_per_token)))
+
+    def _answer(self, prompt):
+        # JSON prompts show the fields they want in their example answer
+        reasons = '"reason"' in prompt
+        if "Candidates:" in prompt:
+            user = re.search(r"^User likes: (.*)$", prompt, re.M).group(1)
+            candidates = prompt.split("Candidates:", 1)[1]
+            return "\n".join(
+                f'{{"id": {n}, "score": {fake_score(user, foods)}'
+                + (f', "reason": "Overlap between {user[:20]} and {foods[:20]}"}}'
+                   if reasons else "}")
+                for n, foods in _BATCH_LINE.findall(candidates)
+            )
+        likes = _LIKES.findall(prompt)
+        if len(likes) == 2:
+            score = fake_score(*likes)
+            if "Person A likes" in prompt:
+                return f"Score: {score}\nShared: {likes[0][:30]}\nReason: Similar tastes."
+            if '"score"' not in prompt:
+                return f'{{"reason": "Similar tastes in {likes[0][:30]}"}}'
+            if not reasons:
+                return f'{{"score": {score}}}'
+            return f'{{"score": {score}, "reason": "Similar tastes in {likes[0][:30]}"}}'
+        match = re.search(r"^User: (.*)$", prompt, re.M)
+        return f"Foods: {match.group(1) if match else ''}"
+
+    def _tokens(self, text, max_tokens):
+        step = self.chars_per_token
+        tokens = [text[i:i + step] for i in range(0, len(text), step)]
+        return tokens[:max_tokens] if max_tokens else tokens
+
+    def __call__(self, prompt, max_tokens=256, stream=False, **kwargs):
+        self.calls += 1
+        time.sleep(len(self.tokenize(prompt)) * self.prompt_token_latency)
+        tokens = self._tokens(self._answer(prompt), max_tokens)
+        self.completion_tokens += len(tokens)
+
+        if stream:
+            return self._stream(tokens)
+        time.sleep(len(tokens) * self.token_latency)
+        return {
+            "choices": [{"text": "".join(tokens), "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": len(self.tokenize(prompt)),
+                "completion_tokens": len(tokens),
+            },
+        }
+
+    def _stream(self, tokens):
+        for token in tokens:
+            time.sleep(self.token_latency)
+            yield {"choices": [{"text": token, "finish_reason": None}]}
+
+    def _word_vector(self, word):
+        seed = int(hashlib.sha1(word.encode("utf-8")).hexdigest()[:8], 16)
+        return np.random.default_rng(seed).standard_normal(self.embedding_dim)
+
+    def embed(self, input):
+        """One vector per text (a list of texts, or a single string)"""
+        texts = [input] if isinstance(input, str) else list(input)
+        self.calls += 1
+        time.sleep(sum(len(self.tokenize(t.encode("utf-8"))) for t in texts)
+                   * self.prompt_token_latency)
+        vectors = []
+        for text in texts:
+            words = text.lower().split() or [""]
+            vectors.append(sum(self._word_vector(w) for w in words).tolist())
+        return vectors[0] if isinstance(input, str) else vectors
@@ -0,0 +1,79 @@
+# benchmarks/grammar_tokens.py
+"""
+Average generated tokens per pair for llm_full_match, free-form vs grammar,
+and for the score-only llm_score_match
+
+Runs FULL_MATCH_PROMPT on the same pairs twice: once unconstrained (the old
+max_tokens=120, stop=["}", "\\n\\n"] call) and once with FULL_MATCH_GRAMMAR;
+then SCORE_PROMPT with SCORE_GRAMMAR.
+Run from the repository root (needs the GGUF model):
+
+    python benchmarks/grammar_tokens.py --pairs 20
+"""
+
+import os
+import sys
+import json
+import argparse
+import itertools
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_utils_updated import load_llm
+from llm_full_matcher import (
+    FULL_MATCH_PROMPT, FULL_MATCH_MAX_TOKENS, full_match_grammar,
+    SCORE_PROMPT, SCORE_MAX_TOKENS, score_grammar,
+)
+from prompt_cache import SAMPLE_FOODS
+
+
+def valid_answer(text, reason=True):
+    try:
+        data = json.loads(text)
+        return 0 <= int(data["score"]) <= 100 and (not reason or isinstance(data["reason"], str))
+    except (ValueError, KeyError, TypeError):
+        return False
+
+
+def run(llm, prompts, reason=True, **kwargs):
+    """(average completion tokens, share of answers that parse as valid JSON)"""
+    tokens = 0
+    valid = 0
+    for prompt in prompts:
+        out = llm(prompt, temperature=0.3, **kwargs)
+        tokens += out["usage"]["completion_tokens"]
+        text = out["choices"][0]["text"].strip()
+        if "stop" in kwargs and not text.endswith("}"):
+            text += "}"  # the old code re-added the stop brace
+        valid += valid_answer(text, reason)
+    return tokens / len(prompts), valid / len(prompts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pairs", type=int, default=20, help="number of user pairs")
+    args = parser.parse_args()
+
+    pairs = itertools.islice(itertools.cycle(itertools.combinations(SAMPLE_FOODS, 2)), args.pairs)
+    pairs = list(pairs)
+    prompts = [FULL_MATCH_PROMPT.format(foods_a=", ".join(a), foods_b=", ".join(b))
+               for a, b in pairs]
+    score_prompts = [SCORE_PROMPT.format(foods_a=", ".join(a), foods_b=", ".join(b))
+                     for a, b in pairs]
+
+    llm = load_llm()
+    free = run(llm, prompts, max_tokens=120, stop=["}", "\n\n"])
+    constrained = run(llm, prompts, max_tokens=FULL_MATCH_MAX_TOKENS, grammar=full_match_grammar())
+    score_only = run(llm, score_prompts, reason=False, max_tokens=SCORE_MAX_TOKENS,
+                     grammar=score_grammar())
+
+    print(f"{'mode':<12} {'avg tokens':>11} {'valid JSON':>11}")
+    for label, (avg, ok) in (("free-form", free), ("grammar", constrained),
+                             ("score-only", score_only)):
+        print(f"{label:<12} {avg:>11.1f} {ok:>10.0%}")
+    print(f"token change: {constrained[0] - free[0]:+.1f} per pair")
+    print(f"score-only vs grammar: {score_only[0] - constrained[0]:+.1f} per pair")
+
+
+if __name__ == "__main__":
+    main()
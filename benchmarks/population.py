@@ -0,0 +1,85 @@
+# benchmarks/population.py
+"""
+Seeded synthetic user population for benchmarks
+
+Each profile favours one to three cuisines and mostly picks dishes from
+them, with some "<cuisine> food" entries, general taste keywords, stray
+dishes from other cuisines and inconsistent capitalization, roughly like
+the profiles users type in. The same (n, seed) always gives the same users.
+
+    python benchmarks/population.py --users 10000 --out /tmp/users
+"""
+
+import os
+import sys
+import json
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from match_engine import CUISINE_KEYWORDS, GENERAL_KEYWORDS
+from user_store import user_filename
+
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+
+TIMESTAMP = "2025-01-01T00:00:00"
+
+
+def _food(rng, favourites, cuisines):
+    roll = rng.random()
+    if roll < 0.70:
+        item = rng.choice(CUISINE_KEYWORDS[rng.choice(favourites)])
+    elif roll < 0.80:
+        item = f"{rng.choice(favourites)} food"
+    elif roll < 0.92:
+        item = rng.choice(GENERAL_KEYWORDS)
+    else:
+        item = rng.choice(CUISINE_KEYWORDS[rng.choice(cuisines)])
+    if rng.random() < 0.2:
+        item = item.title()
+    return item
+
+
+def generate_population(n, seed=0):
+    """`n` profiles with unique names, in the same format as data/users"""
+    rng = random.Random(seed)
+    cuisines = list(CUISINE_KEYWORDS)
+    users = []
+    for i in range(n):
+        favourites = rng.sample(cuisines, rng.choice((1, 1, 2, 2, 3)))
+        foods = []
+        for _ in range(rng.randint(2, 8)):
+            item = _food(rng, favourites, cuisines)
+            if item.lower() not in (f.lower() for f in foods):
+                foods.append(item)
+        users.append({
+            "name": f"user{i:06d}",
+            "foodChoices": foods,
+            "createdAt": TIMESTAMP,
+            "lastUpdated": TIMESTAMP,
+        })
+    return users
+
+
+def write_population(users, data_dir):
+    """Write profiles as user_*.json files into `data_dir`"""
+    os.makedirs(data_dir, exist_ok=True)
+    for user in users:
+        with open(os.path.join(data_dir, user_filename(user["name"])), "w") as f:
+            json.dump(user, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=1_000, help="number of profiles")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True, help="directory to write user_*.json into")
+    args = parser.parse_args()
+
+    write_population(generate_population(args.users, args.seed), args.out)
+    print(f"✅ Wrote {args.users} profiles to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
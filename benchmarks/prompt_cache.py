@@ -0,0 +1,83 @@
+# benchmarks/prompt_cache.py
+"""
+Per-call prompt evaluation time with and without the llama.cpp prompt cache
+
+Each call generates a single token, so its wall time is dominated by prompt
+evaluation. Run from the repository root (needs the GGUF model):
+
+    python benchmarks/prompt_cache.py --calls 10
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_utils_updated import load_llm, EXTRACTION_PROMPT
+from llm_full_matcher import FULL_MATCH_PROMPT
+from match_engine import SCORING_PROMPT
+
+SAMPLE_FOODS = [
+    ["pizza", "pasta"],
+    ["sushi", "ramen", "spicy food"],
+    ["tacos", "burrito", "churro"],
+    ["biryani", "butter chicken", "naan"],
+    ["pho", "banh mi", "bubble tea"],
+    ["korean bbq", "kimchi", "fried chicken"],
+]
+
+
+def build_prompts(calls):
+    """`calls` distinct prompts per template, varying only the user part"""
+    prompts = {"extraction": [], "full_match": [], "scoring": []}
+    for i in range(calls):
+        a = SAMPLE_FOODS[i % len(SAMPLE_FOODS)]
+        b = SAMPLE_FOODS[(i + 1) % len(SAMPLE_FOODS)]
+        prompts["extraction"].append(
+            EXTRACTION_PROMPT + f"\nUser: I really like {' and '.join(a)}\n\nExtract:\n")
+        prompts["full_match"].append(
+            FULL_MATCH_PROMPT.format(foods_a=", ".join(a), foods_b=", ".join(b)))
+        prompts["scoring"].append(
+            SCORING_PROMPT.format(foods_a=", ".join(a), foods_b=", ".join(b)))
+    return prompts
+
+
+def time_calls(llm, prompts):
+    """
+    Mean/median milliseconds per single-token call, per template.
+    Templates are interleaved as in the server, so without the prompt cache
+    llama.cpp can't simply keep the previous call's prefix evaluated.
+    """
+    timings = {name: [] for name in prompts}
+    for i in range(len(next(iter(prompts.values())))):
+        for name, batch in prompts.items():
+            start = time.perf_counter()
+            llm(batch[i], max_tokens=1, temperature=0.0)
+            timings[name].append((time.perf_counter() - start) * 1000)
+    return {name: (statistics.mean(t), statistics.median(t)) for name, t in timings.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=10, help="calls per prompt template")
+    args = parser.parse_args()
+
+    prompts = build_prompts(args.calls)
+    runs = {}
+    for label, cached in (("before (no prompt cache)", False), ("after (prompt cache)", True)):
+        llm = load_llm(prompt_cache=cached)
+        runs[label] = time_calls(llm, prompts)
+        del llm
+
+    print(f"{'template':<12} {'run':<26} {'mean ms':>9} {'median ms':>10}")
+    for name in prompts:
+        for label, results in runs.items():
+            mean, median = results[name]
+            print(f"{name:<12} {label:<26} {mean:>9.1f} {median:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
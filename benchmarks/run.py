@@ -0,0 +1,329 @@
+# benchmarks/run.py
+"""
+Food-Friend benchmark suite (no model file needed)
+
+Times normalize_food_list, score_pair, score_many and llm_hybrid_match on
+seeded synthetic populations, measures the taste index's recall against the
+exact score_pair top-k at several nprobe settings, and times end-to-end
+/api/calculate-matches through the Flask test client, with FakeLlama
+standing in for the model. Results are
+written as JSON and compared against a stored baseline (the first run saves
+one); any benchmark slower than baseline * (1 + tolerance) is flagged and
+the exit status is 1.
+
+Everything runs in a temporary directory, so data/ is never touched.
+Run from the repository root:
+
+    python benchmarks/run.py                         # run and compare
+    python benchmarks/run.py --save-baseline         # record a new baseline
+    python benchmarks/run.py --sizes 1k,10k,100k --e2e-sizes 1k,10k
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from contextlib import redirect_stdout
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+from population import SIZES, generate_population, write_population
+from fake_llm import FakeLlama
+from config import TOPK_SIZE
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, "results", "latest.json")
+
+
+def parse_sizes(text):
+    """"1k,10k" or "1000,10000" -> [1000, 10000]"""
+    return [SIZES.get(s, None) or int(s) for s in text.split(",") if s]
+
+
+def label(n):
+    return next((name for name, size in SIZES.items() if size == n), str(n))
+
+
+def timed(fn, ops, repeat):
+    """Run `fn` `repeat` times; per-op milliseconds (median run) and spread"""
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append((time.perf_counter() - start) * 1000 / ops)
+    return {
+        "median_ms": statistics.median(runs),
+        "min_ms": min(runs),
+        "max_ms": max(runs),
+        "ops": ops,
+        "repeat": repeat,
+    }
+
+
+# --------------------------------------------------------
+# Micro benchmarks
+# --------------------------------------------------------
+def bench_matching(results, sizes, repeat, seed):
+    from match_engine import (
+        normalize_food_list, score_pair, score_many, clear_feature_cache, FeatureMatrix,
+    )
+
+    for n in sizes:
+        users = generate_population(n, seed)
+        rng = random.Random(seed)
+        pairs = [(rng.choice(users), rng.choice(users)) for _ in range(min(n, 10_000))]
+
+        results[f"normalize_food_list[{label(n)}]"] = timed(
+            lambda: [normalize_food_list(u["foodChoices"]) for u in users], n, repeat)
+
+        def cold_pairs():
+            clear_feature_cache()
+            for a, b in pairs:
+                score_pair(a, b)
+        results[f"score_pair.cold[{label(n)}]"] = timed(cold_pairs, len(pairs), repeat)
+        results[f"score_pair.warm[{label(n)}]"] = timed(
+            lambda: [score_pair(a, b) for a, b in pairs], len(pairs), repeat)
+
+        matrix = FeatureMatrix(users)
+        probes = users[:20]
+        results[f"score_many[{label(n)}]"] = timed(
+            lambda: [score_many(u, matrix, 5) for u in probes], len(probes), repeat)
+
+
+def bench_llm(results, pairs, token_latency, seed):
+    """llm_hybrid_match per pair: first with an empty pair cache, then cached"""
+    from llm_hybrid_matcher import llm_hybrid_match
+
+    users = generate_population(pairs * 2, seed)
+    llm = FakeLlama(token_latency=token_latency)
+    with redirect_stdout(io.StringIO()):
+        for kind in ("cold", "cached"):
+            results[f"llm_hybrid_match.{kind}"] = timed(
+                lambda: [llm_hybrid_match(llm, users[i], users[i + pairs])
+                         for i in range(pairs)], pairs, 1)
+
+
+def bench_ann(results, sizes, k, probes, seed):
+    """
+    Top-k from the taste index (hits rescored with score_pair) against the
+    exact ranking. A returned candidate counts toward recall when its
+    score reaches the exact k-th best score, so ties don't count as misses.
+    """
+    from match_engine import FeatureMatrix, score_vector, top_rows
+    from taste_index import TasteIndex
+
+    for n in sizes:
+        users = generate_population(n, seed)
+        matrix = FeatureMatrix(users)
+        index = TasteIndex(path=None, min_train=0)
+        with redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            index.build(dict(enumerate(users)))
+        results[f"ann.build[{label(n)}]"] = {
+            "median_ms": (time.perf_counter() - start) * 1000, "ops": 1, "repeat": 1}
+
+        queries = random.Random(seed).sample(users, min(probes, n))
+        exact = []
+        start = time.perf_counter()
+        for user in queries:
+            scores = score_vector(user, matrix)
+            exact.append(scores[top_rows(scores, k)])
+        results[f"ann.exact[{label(n)}]"] = {
+            "median_ms": (time.perf_counter() - start) * 1000 / len(queries),
+            "ops": len(queries), "repeat": 1, "recall": 1.0}
+
+        for nprobe in (1, 4, 8, 16, 32):
+            found = total = 0
+            start = time.perf_counter()
+            for user, best in zip(queries, exact):
+                scores = score_vector(user, matrix, index.search(user, nprobe=nprobe))
+                got = scores[top_rows(scores, k)]
+                if len(best):
+                    found += int((got >= best[-1]).sum())
+                    total += len(best)
+            results[f"ann.nprobe={nprobe}[{label(n)}]"] = {
+                "median_ms": (time.perf_counter() - start) * 1000 / len(queries),
+                "ops": len(queries), "repeat": 1,
+                "recall": found / total if total else 1.0}
+
+
+# --------------------------------------------------------
+# End to end (one subprocess per population size)
+# --------------------------------------------------------
+def e2e_worker(n, requests, token_latency, seed):
+    """
+    Runs inside a fresh working directory holding data/users: imports the
+    server (startup: until it can serve; indexes: until the background
+    match indexes are built), serves `requests` users' calculate-matches
+    twice (first pass computes, second is served from the top-k table) and
+    prints JSON
+    """
+    log = io.StringIO()
+    with redirect_stdout(log):
+        start = time.perf_counter()
+        import api_server
+        startup_ms = (time.perf_counter() - start) * 1000
+        api_server.indexes_ready.wait()
+        indexes_ms = (time.perf_counter() - start) * 1000
+        api_server.llm_pool.add(FakeLlama(token_latency=token_latency))
+        client = api_server.app.test_client()
+        names = [u["name"] for u in random.Random(seed).sample(generate_population(n, seed), requests)]
+
+        timings = {}
+        for kind in ("cold", "stored"):
+            runs = []
+            for name in names:
+                t = time.perf_counter()
+                resp = client.post("/api/calculate-matches", json={"name": name})
+                runs.append((time.perf_counter() - t) * 1000)
+                assert resp.status_code == 200, resp.get_json()
+            timings[kind] = runs
+
+    out = {
+        f"e2e.startup[{label(n)}]": {"median_ms": startup_ms, "ops": 1, "repeat": 1},
+        f"e2e.indexes[{label(n)}]": {"median_ms": indexes_ms, "ops": 1, "repeat": 1},
+    }
+    for kind, runs in timings.items():
+        out[f"e2e.calculate_matches.{kind}[{label(n)}]"] = {
+            "median_ms": statistics.median(runs),
+            "min_ms": min(runs),
+            "max_ms": max(runs),
+            "ops": len(runs),
+            "repeat": 1,
+        }
+    print(json.dumps(out))
+
+
+def bench_e2e(results, sizes, requests, token_latency, seed):
+    for n in sizes:
+        with tempfile.TemporaryDirectory(prefix="foodfriend-bench-") as workdir:
+            write_population(generate_population(n, seed), os.path.join(workdir, "data", "users"))
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--e2e-worker", str(n),
+                 "--requests", str(requests), "--token-latency", str(token_latency),
+                 "--seed", str(seed)],
+                cwd=workdir, capture_output=True, text=True,
+            )
+            if proc.returncode != 0:
+                raise RuntimeError(f"e2e worker for {n} users failed:\n{proc.stderr}")
+            results.update(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+
+# --------------------------------------------------------
+# Baseline comparison
+# --------------------------------------------------------
+def compare(results, baseline, tolerance):
+    """[(name, baseline ms, current ms, change, regressed)] for shared benchmarks"""
+    rows = []
+    for name, current in results.items():
+        base = baseline.get(name, {}).get("median_ms")
+        if not base:
+            continue
+        change = current["median_ms"] / base - 1
+        rows.append((name, base, current["median_ms"], change, change > tolerance))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1k,10k,100k", help="populations for micro benchmarks")
+    parser.add_argument("--e2e-sizes", default="1k,10k", help="populations for calculate-matches")
+    parser.add_argument("--requests", type=int, default=20, help="users matched per e2e run")
+    parser.add_argument("--ann-sizes", default="10k,100k", help="populations for the taste index")
+    parser.add_argument("--ann-probes", type=int, default=200, help="queries per recall run")
+    parser.add_argument("--llm-pairs", type=int, default=50, help="pairs for llm_hybrid_match")
+    parser.add_argument("--token-latency", type=float, default=0.002,
+                        help="FakeLlama seconds per generated token")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per micro benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="write these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown before a benchmark is flagged")
+    parser.add_argument("--e2e-worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.e2e_worker:
+        e2e_worker(args.e2e_worker, args.requests, args.token_latency, args.seed)
+        return
+
+    # Nothing to compare against yet: this run becomes the baseline
+    if not args.save_baseline and not os.path.exists(args.baseline):
+        print(f"⚠️  No baseline at {args.baseline}; nothing is compared, this run's "
+              f"results will be saved as the baseline")
+        args.save_baseline = True
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="foodfriend-bench-") as workdir:
+        os.chdir(workdir)  # pair cache etc. go to a throwaway data/
+        print("⏱️  Matching benchmarks...")
+        bench_matching(results, parse_sizes(args.sizes), args.repeat, args.seed)
+        print("⏱️  Taste index recall benchmarks...")
+        bench_ann(results, parse_sizes(args.ann_sizes), TOPK_SIZE, args.ann_probes, args.seed)
+        print("⏱️  LLM benchmarks (FakeLlama)...")
+        bench_llm(results, args.llm_pairs, args.token_latency, args.seed)
+        print("⏱️  End-to-end benchmarks...")
+        bench_e2e(results, parse_sizes(args.e2e_sizes), args.requests,
+                  args.token_latency, args.seed)
+        os.chdir(ROOT)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "args": {k: v for k, v in vars(args).items() if k != "e2e_worker"},
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {args.output}\n")
+
+    baseline = {}
+    if not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    rows = {name: row for name, *row in compare(results, baseline, args.tolerance)}
+    print(f"{'benchmark':<44} {'ms/op':>10} {'baseline':>10} {'change':>8}")
+    for name, result in results.items():
+        line = f"{name:<44} {result['median_ms']:>10.4f}"
+        if name in rows:
+            base, _, change, regressed = rows[name]
+            line += f" {base:>10.4f} {change:>+7.0%}" + ("  ❌ REGRESSION" if regressed else "")
+        if "recall" in result:
+            line += f"  recall {result['recall']:.3f}"
+        print(line)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n📌 Baseline saved to {args.baseline}")
+    else:
+        unchecked = [name for name in results if name not in rows]
+        if unchecked:
+            print(f"\n⚠️  {len(unchecked)} benchmark(s) not in the baseline, not checked: "
+                  + ", ".join(unchecked))
+
+    regressions = [name for name, row in rows.items() if row[3]]
+    if regressions and not args.save_baseline:
+        print(f"\n❌ {len(regressions)} benchmark(s) slower than baseline by more "
+              f"than {args.tolerance:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,6 @@
 # chat_bot.py
 
 import os
-import json
 import uuid
 from datetime import datetime
 from dotenv import load_dotenv
@@ -10,41 +9,13 @@ from dotenv import load_dotenv
 load_dotenv()
 APP_NAME = os.getenv('APP_NAME', 'Food Friend')
 
-from llm_utils_updated import load_llm, extract_food_choices
+from llm_utils_updated import load_llm
+from food_extraction import get_food_extractor
 from llm_hybrid_matcher import llm_hybrid_match
+from llm_full_matcher import llm_match_reason
+from user_store import get_user_store
 
-DATA_DIR = "data/users"
-os.makedirs(DATA_DIR, exist_ok=True)
-
-def user_file(name):
-    safe = name.replace(" ", "_").lower()
-    return os.path.join(DATA_DIR, f"user_{safe}.json")
-
-def save_user_json(data):
-    with open(user_file(data["name"]), "w") as f:
-        json.dump(data, f, indent=2)
-
-def load_all_users(exclude=None):
-    users = []
-    for fname in os.listdir(DATA_DIR):
-        if not fname.endswith(".json"):
-            continue
-        path = os.path.join(DATA_DIR, fname)
-        try:
-            with open(path) as f:
-                data = json.load(f)
-        except:
-            continue
-
-        if "name" not in data:
-            continue
-        if exclude and data["name"].lower() == exclude.lower():
-            continue
-
-        data.setdefault("foodChoices", [])
-        users.append(data)
-
-    return users
+user_store = get_user_store()
 
 
 def main():
@@ -55,13 +26,11 @@ def main():
         print("Name cannot be empty.")
         return
 
-    path = user_file(name)
+    user = user_store.get(name)
 
     # Load or create profile
-    if os.path.exists(path):
+    if user is not None:
         print(f"Loaded existing profile for {name}\n")
-        with open(path) as f:
-            user = json.load(f)
         user.setdefault("name", name)
         user.setdefault("foodChoices", [])
         user.setdefault("userId", str(uuid.uuid4()))
@@ -81,20 +50,18 @@ def main():
     print("\nDescribe your favorite foods or cuisines:")
     desc = input("> ").strip()
 
-    choices = extract_food_choices(llm, desc)
-    if not isinstance(choices, list):
-        choices = []
+    choices = get_food_extractor().extract(llm, desc)
 
     print("\nExtracted food choices:", choices)
 
     user["foodChoices"] = choices
     user["lastUpdated"] = str(datetime.now())
-    save_user_json(user)
+    user_store.save(user)
 
     print("\nSaved your preferences!")
     print("Finding your top matches...\n")
 
-    others = load_all_users(exclude=name)
+    others = user_store.all_users(exclude=name)
     if not others:
         print("No other users yet.")
         return
@@ -103,15 +70,20 @@ def main():
     results = []
     for other in others:
         result = llm_hybrid_match(llm, user, other)
-        results.append((other["name"], result))
+        results.append((other, result))
 
     results.sort(key=lambda x: x[1]["final_score"], reverse=True)
 
     print("Top Matches:\n")
-    for name, r in results[:5]:
+    for other, r in results[:5]:
+        name = other["name"]
+        # Score-only scoring (MATCH_REASONS = "lazy") → reasons for the shown matches only
+        if not r["reason"] and r["llm_score"] is not None:
+            r["reason"] = llm_match_reason(llm, user, other) or ""
         print(f"{name}: {r['final_score']}% match")
         print(f"  Python score: {r['python_score']}%")
-        print(f"  LLM score: {r['llm_score']}%")
+        if r["llm_score"] is not None:
+            print(f"  LLM score: {r['llm_score']}%")
         print(f"  Reason: {r['reason']}")
 
         if r["matched_cuisines"]:
@@ -1,9 +1,18 @@
 """
 Shared configuration for llama.cpp workshop
 This file contains common settings used across all workshop modules
+Settings read with os.getenv() can be overridden from the environment or .env
 """
+import os
 from pathlib import Path
 
+
+def _env_int(name, default):
+    """Integer setting from the environment (.env), else `default`"""
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
 # ==================== MODEL CONFIGURATION ====================
 
 # Path to your GGUF model file
@@ -20,6 +29,33 @@ DEFAULT_CONTEXT_SIZE = 2048
 # If you have a compatible GPU, setting this to -1 will speed up inference
 DEFAULT_GPU_LAYERS = 0  # Change to -1 for GPU acceleration
 
+# Number of model instances serving concurrent requests (per server process)
+# The GGUF file is memory-mapped, so instances share the weights in RAM;
+# each one adds its own context (KV cache) memory
+LLM_POOL_SIZE = _env_int("LLM_POOL_SIZE", 1)
+
+# Total CPU threads for LLM inference (None = all cores), split evenly
+# between the server's worker processes and then across each pool
+LLM_THREADS = _env_int("LLM_THREADS", None)
+
+# Seconds a request waits for a free model instance before giving up (503)
+LLM_POOL_TIMEOUT = 30
+
+# Memory-map the GGUF file (pages load on demand and are shared between
+# model instances and processes) and optionally lock them in RAM so the
+# OS can't swap the weights out
+LLM_USE_MMAP = True
+LLM_USE_MLOCK = False
+
+# Model loading runs in the background; failures are retried after
+# LLM_LOAD_RETRY_INITIAL seconds, doubling up to LLM_LOAD_RETRY_MAX
+LLM_LOAD_RETRY_INITIAL = 5
+LLM_LOAD_RETRY_MAX = 300
+
+# RAM (bytes) for saved llama.cpp states of the fixed prompt prefixes
+# Lets each call skip re-evaluating the shared instructions; 0 disables it
+PROMPT_CACHE_BYTES = 1 << 30  # 1 GiB
+
 
 # ==================== MATCHING CONFIGURATION ====================
 
@@ -28,6 +64,144 @@ DEFAULT_GPU_LAYERS = 0  # Change to -1 for GPU acceleration
 # Set to False to use rule-based keyword matching (faster, less nuanced)
 USE_LLM_SCORING = True
 
+# Background threads running /api/match-jobs requests
+MATCH_JOB_WORKERS = 2
+
+# Seconds a finished match job stays available for polling
+MATCH_JOB_TTL = 600
+
+# SQLite file mirroring match job state, so every server process can
+# answer polls for jobs started in another one
+MATCH_JOB_DB_PATH = Path("data/match_jobs.sqlite3")
+
+# Number of distinct food lists whose normalized features are kept in memory
+FEATURE_CACHE_SIZE = 200_000
+
+# Size of each user's persisted top-k candidate row (the Python pass keeps
+# this many candidates for the LLM)
+TOPK_SIZE = 5
+
+# SQLite file holding the top-k rows and their last hybrid matches
+TOPK_PATH = Path("data/topk.sqlite3")
+
+# On startup, profiles changed while the server was down are patched into
+# the stored rows one by one (a full scoring pass each). Above this share
+# of the stored rows (e.g. after a bulk import) the rows are dropped
+# instead and rebuilt lazily on each user's next request
+TOPK_REPLAY_MAX_FRACTION = 0.05
+
+# Weight of the rule-based score in the final hybrid score; the semantic
+# score (LLM or embedding similarity) gets the rest
+HYBRID_PYTHON_WEIGHT = 0.6
+
+# Matches returned per request
+MATCH_RESULTS = 3
+
+# Users whose last /api/calculate-matches result is kept in memory
+MATCH_RESULT_CACHE_SIZE = 10_000
+
+
+# ==================== EMBEDDING CONFIGURATION ====================
+
+# Where the hybrid matcher's semantic score for the top candidates comes from:
+#   "embedding"  cosine of the users' mean item embeddings (no generation;
+#                falls back to "llm" until the embedding model has loaded)
+#   "llm"        batched generative scoring
+SEMANTIC_SCORING = "embedding"
+
+# When match reasons are written by the LLM:
+#   "lazy"    scoring generates only the numeric scores; a pair's reason is
+#             generated by /api/match-reason when the user asks for it
+#   "inline"  every scored candidate gets its reason in the same generation
+MATCH_REASONS = "lazy"
+
+# GGUF model loaded in embedding mode (the chat model works; a dedicated
+# embedding model gives better food similarity)
+EMBEDDING_MODEL_PATH = MODEL_PATH
+
+# Length of the model's embedding vectors (None = read from the GGUF header)
+EMBEDDING_DIM = None
+
+# SQLite file holding one vector per distinct food item
+EMBEDDING_CACHE_PATH = Path("data/embeddings.sqlite3")
+
+# Number of user taste vectors (mean of item vectors) kept in memory
+EMBEDDING_USER_CACHE_SIZE = 100_000
+
+
+# ==================== ANN INDEX CONFIGURATION ====================
+
+# How the Python pass finds each user's top-k candidates:
+#   "ann"    nearest taste vectors from an IVF index, rescored exactly
+#   "exact"  score_pair against every profile (vectorized linear scan)
+CANDIDATE_SEARCH = "ann"
+
+# Below this many profiles the index is not clustered and search is exact
+ANN_MIN_TRAIN = 2_000
+
+# Profiles fetched from the index per query and rescored with score_pair
+ANN_CANDIDATES = 256
+
+# Clusters scanned per query (more = better recall, slower)
+ANN_NPROBE = 16
+
+# Weight of the item-embedding part of a taste vector, in score_pair points
+# (a cuisine one-hot is worth 30, a general keyword 5, full dish overlap 40)
+ANN_EMBEDDING_WEIGHT = 20
+
+# Taste vectors and cluster centroids, saved on exit and reused on startup
+ANN_INDEX_PATH = Path("data/taste_index.npz")
+
+
+# ==================== FOOD EXTRACTION CONFIGURATION ====================
+
+# Share of the rule parser's items that must be known cuisine/keyword terms
+# for /api/extract-foods to skip the LLM (1.0 = every item recognized).
+# Below 1.0 unrecognized phrases ("my dog", "cooking pasta") are returned
+# as foods too
+EXTRACTION_MIN_COVERAGE = 1.0
+
+# Number of extracted descriptions kept in memory (least recently used evicted)
+EXTRACTION_CACHE_SIZE = 10_000
+
+
+# ==================== USER STORE CONFIGURATION ====================
+
+# Where profiles live: "json" (one file per user in USER_DATA_DIR) or
+# "sqlite" (one indexed database at USER_DB_PATH; import existing files
+# with `python migrate_users.py`)
+USER_STORE_BACKEND = "json"
+
+# Directory holding one JSON profile per user
+USER_DATA_DIR = "data/users"
+
+# SQLite database used by the "sqlite" backend
+USER_DB_PATH = Path("data/users.sqlite3")
+
+# Window (seconds) in which repeated /api/update-foods saves of one user
+# are coalesced into a single write; readers see each update immediately
+USER_WRITE_COALESCE_SECONDS = 0.5
+
+# Seconds between re-scans in the in-memory user store
+# Writes made through the store are visible immediately; this only bounds
+# how long an external edit (another process, a hand-edited file) can go
+# unnoticed
+USER_STORE_RESCAN_INTERVAL = 2.0
+
+# Profiles serialized per chunk when GET /api/users streams its response
+USERS_PAGE_BATCH = 500
+
+
+# ==================== LLM CACHE CONFIGURATION ====================
+
+# SQLite file holding LLM pair scores across restarts
+# Entries are tied to MODEL_PATH and the prompt text, so changing either
+# invalidates them automatically
+LLM_CACHE_PATH = Path("data/llm_cache.sqlite3")
+
+# Number of pair results also kept in memory (least recently used evicted)
+LLM_CACHE_MEMORY_SIZE = 4096
+
 
 # ==================== GENERATION PARAMETERS ====================
 
@@ -42,8 +216,46 @@ DEFAULT_PARAMS = {
 }
 
 
+# ==================== SERVER CONFIGURATION ====================
+
+# Production server: gunicorn -c gunicorn.conf.py api_server:app
+# (`python api_server.py` still runs the single-process dev server)
+
+# Address the server listens on
+SERVER_BIND = os.getenv("SERVER_BIND", "0.0.0.0:5000")
+
+# Worker processes. The model weights are shared, but each worker holds
+# its own profiles and indexes, LLM_POOL_SIZE + 1 llama.cpp contexts (KV
+# cache) and up to PROMPT_CACHE_BYTES of saved prompt states, and gets
+# only LLM_THREADS / SERVER_WORKERS inference threads. Kept small so one
+# generation still runs on several cores; raise it for non-LLM traffic
+# only when RAM allows (~1.5 GiB per extra worker with the defaults)
+SERVER_WORKERS = _env_int("SERVER_WORKERS", 2)
+
+# Request threads per worker process
+SERVER_THREADS = _env_int("SERVER_THREADS", 4)
+
+# Seconds a stopping worker gets to finish in-flight requests, LLM calls
+# and match jobs before it is killed
+SERVER_GRACEFUL_TIMEOUT = _env_int("SERVER_GRACEFUL_TIMEOUT", 60)
+
+# Seconds a worker may stay unresponsive (including loading the profiles
+# at startup) before it is restarted
+SERVER_TIMEOUT = _env_int("SERVER_TIMEOUT", 120)
+
+
 # ==================== HELPER FUNCTIONS ====================
 
+def llm_thread_budget():
+    """
+    CPU threads for LLM inference in this process: LLM_THREADS (or every
+    core) divided between the server's worker processes, whose count the
+    launcher exports as FOODFRIEND_SERVER_PROCESSES
+    """
+    total = LLM_THREADS or os.cpu_count() or 1
+    return max(1, total // int(os.getenv("FOODFRIEND_SERVER_PROCESSES", "1")))
+
+
 def check_model_exists():
     """
     Validate that the model file exists before attempting to load it
@@ -1,63 +1,12 @@
 # draft_chat_bot.py
 
-import os
-import json
 from datetime import datetime
 
 from llm_utils import load_llm, extract_food_choices
 from match_engine import score_pair_with_llm
+from user_store import get_user_store
 
-DATA_DIR = "data/users"
-os.makedirs(DATA_DIR, exist_ok=True)
-
-def user_file(name):
-    safe = name.replace(" ", "_").lower()
-    return os.path.join(DATA_DIR, f"user_{safe}.json")
-
-
-def save_user_json(data):
-    """
-    Saves user JSON with guaranteed correct schema:
-    {
-      "name": "",
-      "foodChoices": [],
-      "createdAt": "",
-      "lastUpdated": ""
-    }
-    """
-    with open(user_file(data["name"]), "w") as f:
-        json.dump(data, f, indent=2)
-
-
-def load_all_users(exclude=None):
-    """
-    Loads all users except the current one.
-    Ensures each loaded user has 'name' and 'foodChoices'.
-    """
-    users = []
-
-    for fname in os.listdir(DATA_DIR):
-        if not fname.endswith(".json"):
-            continue
-
-        path = os.path.join(DATA_DIR, fname)
-        try:
-            with open(path) as f:
-                data = json.load(f)
-        except:
-            continue
-
-        # Guarantee required fields
-        if "name" not in data:
-            continue
-
-        if exclude and data["name"].lower() == exclude.lower():
-            continue
-
-        data.setdefault("foodChoices", [])
-        users.append(data)
-
-    return users
+user_store = get_user_store()
 
 
 def main():
@@ -68,13 +17,11 @@ def main():
         print("Name cannot be empty.")
         return
 
-    path = user_file(name)
+    user = user_store.get(name)
 
     # Load or create profile
-    if os.path.exists(path):
+    if user is not None:
         print(f"Loaded existing profile for {name}\n")
-        with open(path) as f:
-            user = json.load(f)
 
         # Guarantee fields
         user.setdefault("name", name)
@@ -106,13 +53,13 @@ def main():
     # Update user
     user["foodChoices"] = choices
     user["lastUpdated"] = str(datetime.now())
-    save_user_json(user)
+    user_store.save(user)
 
     print("\nSaved your preferences!")
     print("Finding your top matches...\n")
 
     # Load other users
-    others = load_all_users(exclude=name)
+    others = user_store.all_users(exclude=name)
 
     if not others:
         print("No other users yet. Add more profiles!")
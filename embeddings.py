@@ -0,0 +1,221 @@
+# embeddings.py
+"""
+Embedding-based taste similarity for Food-Friend
+Every distinct food item is embedded once with the GGUF model in embedding
+mode and cached on disk; a user's taste vector is the mean of their item
+vectors, and two users' similarity is the cosine of those vectors
+"""
+
+import struct
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from config import (
+    EMBEDDING_MODEL_PATH, EMBEDDING_CACHE_PATH, EMBEDDING_USER_CACHE_SIZE, EMBEDDING_DIM,
+)
+
+
+def normalize_item(item):
+    """Cache key for a food item: lowercased, whitespace collapsed"""
+    return " ".join(item.lower().split())
+
+
+def cosine(a, b):
+    """Cosine similarity of two vectors (0.0 if either is all zeros)"""
+    norm = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return float(np.dot(a, b)) / norm if norm else 0.0
+
+
+def similarity_score(a, b):
+    """Cosine of two taste vectors as a 0-100 score (negative → 0)"""
+    return max(0, min(100, round(100 * cosine(a, b))))
+
+
+# --------------------------------------------------------
+# GGUF header
+# --------------------------------------------------------
+# Fixed-size GGUF metadata value types -> struct format
+_GGUF_SCALARS = {0: "B", 1: "b", 2: "H", 3: "h", 4: "I", 5: "i", 6: "f", 7: "?",
+                 10: "Q", 11: "q", 12: "d"}
+_GGUF_STRING = 8
+_GGUF_ARRAY = 9
+
+
+def _gguf_read(f, fmt):
+    data = f.read(struct.calcsize(fmt))
+    if len(data) < struct.calcsize(fmt):
+        raise ValueError("truncated GGUF header")
+    return struct.unpack("<" + fmt, data)[0]
+
+
+def _gguf_value(f, kind):
+    if kind == _GGUF_STRING:
+        return f.read(_gguf_read(f, "Q")).decode("utf-8", "replace")
+    if kind == _GGUF_ARRAY:
+        item_kind, count = _gguf_read(f, "I"), _gguf_read(f, "Q")
+        if item_kind in _GGUF_SCALARS:
+            f.seek(count * struct.calcsize(_GGUF_SCALARS[item_kind]), 1)
+        else:
+            for _ in range(count):
+                _gguf_value(f, item_kind)
+        return None
+    if kind not in _GGUF_SCALARS:
+        raise ValueError(f"unknown GGUF value type {kind}")
+    return _gguf_read(f, _GGUF_SCALARS[kind])
+
+
+def model_embedding_dim(path=EMBEDDING_MODEL_PATH):
+    """
+    Embedding length of a GGUF model, read from its metadata header without
+    loading the model; None if the file is missing or not a GGUF (v2+) file
+    """
+    try:
+        with open(path, "rb") as f:
+            if f.read(4) != b"GGUF" or _gguf_read(f, "I") < 2:
+                return None
+            _gguf_read(f, "Q")  # tensor count
+            arch = None
+            for _ in range(_gguf_read(f, "Q")):
+                key = f.read(_gguf_read(f, "Q")).decode("utf-8", "replace")
+                value = _gguf_value(f, _gguf_read(f, "I"))
+                if key == "general.architecture":
+                    arch = value
+                elif arch is not None and key == f"{arch}.embedding_length":
+                    return int(value)
+    except (OSError, ValueError, struct.error):
+        return None
+    return None
+
+
+class ItemEmbeddingCache:
+    """
+    Item vectors in memory and in a local SQLite file, tied to the model
+    that produced them (vectors from another model are purged on open)
+    """
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH, model=str(EMBEDDING_MODEL_PATH)):
+        self.model = model
+        self._vectors = {}  # item -> float32 vector
+        self._lock = threading.Lock()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS item_vectors (
+                   item TEXT PRIMARY KEY,
+                   model TEXT NOT NULL,
+                   vector BLOB NOT NULL
+               )"""
+        )
+        self._db.execute("DELETE FROM item_vectors WHERE model != ?", (model,))
+        self._db.commit()
+        for item, blob in self._db.execute("SELECT item, vector FROM item_vectors"):
+            self._vectors[item] = np.frombuffer(blob, dtype=np.float32)
+
+    def __len__(self):
+        return len(self._vectors)
+
+    @property
+    def dim(self):
+        """Vector length of the cached model (0 while nothing is cached)"""
+        with self._lock:
+            return len(next(iter(self._vectors.values()), ()))
+
+    def get_many(self, items):
+        """{item: vector} for the items already embedded"""
+        with self._lock:
+            return {item: self._vectors[item] for item in items if item in self._vectors}
+
+    def put_many(self, vectors):
+        """Store {item: vector}"""
+        vectors = {item: np.asarray(v, dtype=np.float32) for item, v in vectors.items()}
+        with self._lock:
+            self._vectors.update(vectors)
+            self._db.executemany(
+                "INSERT OR REPLACE INTO item_vectors (item, model, vector) VALUES (?, ?, ?)",
+                [(item, self.model, v.tobytes()) for item, v in vectors.items()],
+            )
+            self._db.commit()
+
+
+class TasteEmbedder:
+    """
+    User taste vectors built from cached item vectors.
+    `embed(items) -> [vector]` is called only for items never seen before;
+    it may return None (model not loaded yet), in which case those items
+    are left out of the mean until a later call can embed them.
+    """
+
+    def __init__(self, cache=None, user_cache_size=EMBEDDING_USER_CACHE_SIZE, dim=EMBEDDING_DIM):
+        self.cache = cache if cache is not None else ItemEmbeddingCache()
+        # Known before the model loads or anything is cached: config, else
+        # the GGUF header, else whatever vectors are already cached
+        self.dim = dim or model_embedding_dim(self.cache.model) or self.cache.dim
+        self.user_cache_size = user_cache_size
+        self._users = OrderedDict()  # tuple of items -> unit vector
+        self._lock = threading.Lock()
+        self.embedded = 0
+
+    def item_vectors(self, items, embed=None):
+        """{normalized item: vector}, embedding missing items with `embed`"""
+        items = list(dict.fromkeys(normalize_item(i) for i in items if i.strip()))
+        vectors = self.cache.get_many(items)
+        missing = [item for item in items if item not in vectors]
+        if missing and embed is not None:
+            new = embed(missing)
+            if new is not None:
+                new = dict(zip(missing, new))
+                self.cache.put_many(new)
+                vectors.update(self.cache.get_many(missing))
+                self.embedded += len(missing)
+        return vectors
+
+    def user_vector(self, food_choices, embed=None):
+        """Unit-length mean of the user's item vectors, or None if none exist"""
+        key = tuple(normalize_item(i) for i in food_choices if i.strip())
+        with self._lock:
+            vector = self._users.get(key)
+            if vector is not None:
+                self._users.move_to_end(key)
+                return vector
+
+        vectors = self.item_vectors(key, embed)
+        if not vectors:
+            return None
+        vector = np.mean([vectors[item] for item in key if item in vectors], axis=0)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector = vector / norm
+        if len(vectors) < len(set(key)):
+            return vector  # incomplete; don't cache until every item is embedded
+
+        with self._lock:
+            self._users[key] = vector
+            while len(self._users) > self.user_cache_size:
+                self._users.popitem(last=False)
+        return vector
+
+    def similarity(self, foods_a, foods_b, embed=None):
+        """0-100 taste similarity of two food lists, or None without vectors"""
+        a = self.user_vector(foods_a, embed)
+        b = self.user_vector(foods_b, embed)
+        if a is None or b is None:
+            return None
+        return similarity_score(a, b)
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_taste_embedder():
+    """Process-wide taste embedder"""
+    global _embedder
+    with _embedder_lock:
+        if _embedder is None:
+            _embedder = TasteEmbedder()
+        return _embedder
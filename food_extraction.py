@@ -0,0 +1,188 @@
+# food_extraction.py
+"""
+Rule-first food extraction for Food-Friend
+Descriptions like "pizza, tacos and ramen" are split and checked against the
+matching vocabulary without touching the LLM; only descriptions the rules
+can't cover confidently go to extract_food_choices. Results are cached by
+normalized description.
+"""
+
+import re
+import threading
+from collections import OrderedDict
+
+from config import (
+    EXTRACTION_MIN_COVERAGE,
+    EXTRACTION_CACHE_SIZE,
+)
+from match_engine import CUISINE_KEYWORDS, GENERAL_KEYWORDS
+from llm_utils_updated import extract_food_choices
+
+# --------------------------------------------------------
+# Rule-based parser
+# --------------------------------------------------------
+_SEPARATOR = re.compile(r"\s*(?:[,;/&+\n]|\band\b|\bor\b|\bplus\b|\balso\b)\s*")
+
+# Vocabulary phrases that contain a separator ("mac and cheese") are kept
+# whole by joining their words before splitting
+_JOINED = {
+    phrase: phrase.replace(" ", "_")
+    for phrase in [w for words in CUISINE_KEYWORDS.values() for w in words] + GENERAL_KEYWORDS
+    if _SEPARATOR.search(phrase)
+}
+_JOINED_REGEX = re.compile(
+    r"\b(" + "|".join(re.escape(p) for p in sorted(_JOINED, key=len, reverse=True)) + r")\b")
+
+# Lead-in words stripped from the front of each fragment
+_LEAD_IN = re.compile(
+    r"^(?:i\s+|we\s+|really\s+|also\s+|just\s+|absolutely\s+|"
+    r"(?:like|love|enjoy|adore|prefer|want|crave|eat)s?\s+|"
+    r"my\s+favou?rites?\s+(?:are|is|include)\s+|favou?rites?\s*:?\s*|"
+    r"especially\s+|mostly\s+|lots\s+of\s+|some\s+|good\s+|great\s+)+"
+)
+
+# Negation or contrast needs the LLM to decide what the user actually likes
+_NEGATION = re.compile(
+    r"\b(?:not|no|never|don'?t|doesn'?t|didn'?t|hate|hates|dislike|dislikes|"
+    r"allergic|avoid|except|but|without|can'?t)\b"
+)
+
+_STRIP = " \t.!?\"'()-"
+
+# Every phrase an item may be on its own: cuisine names, their dishes and
+# the general taste keywords
+_VOCABULARY = (
+    set(CUISINE_KEYWORDS)
+    | {w for words in CUISINE_KEYWORDS.values() for w in words}
+    | set(GENERAL_KEYWORDS)
+)
+
+# "thai food", "italian cuisine"
+_FOOD_SUFFIX = re.compile(r"\s+(?:food|cuisine)$")
+
+
+def normalize_description(text):
+    """Lowercased, whitespace-collapsed description used as the cache key"""
+    return " ".join(text.lower().split()).strip(_STRIP)
+
+
+def _known(item):
+    """
+    True if the item is exactly a vocabulary phrase (or its plural),
+    optionally followed by "food"/"cuisine". Anything longer ("pizza is
+    life", "a phone call") is left for the LLM.
+    """
+    item = _FOOD_SUFFIX.sub("", item)
+    return item in _VOCABULARY or (item.endswith("s") and item[:-1] in _VOCABULARY)
+
+
+def rule_extract(description):
+    """
+    Split a description on commas, "and"/"or" and similar separators.
+    Returns (items, coverage): coverage is the share of items found in the
+    matching vocabulary, 0.0 when the description negates something.
+    """
+    text = normalize_description(description)
+    if not text or _NEGATION.search(text):
+        return [], 0.0
+
+    text = _JOINED_REGEX.sub(lambda m: _JOINED[m.group(1)], text)
+    items = []
+    for fragment in _SEPARATOR.split(text):
+        item = _LEAD_IN.sub("", fragment.strip(_STRIP)).replace("_", " ").strip(_STRIP)
+        if item and item not in items:
+            items.append(item)
+    if not items:
+        return [], 0.0
+
+    known = sum(1 for item in items if _known(item))
+    return items, known / len(items)
+
+
+# --------------------------------------------------------
+# Cached extractor
+# --------------------------------------------------------
+class FoodExtractor:
+    """
+    Cache → rules → LLM. Counts how many descriptions were answered from
+    the cache and how many skipped the LLM.
+    """
+
+    def __init__(self, min_coverage=EXTRACTION_MIN_COVERAGE, cache_size=EXTRACTION_CACHE_SIZE):
+        self.min_coverage = min_coverage
+        self.cache_size = cache_size
+        self._cache = OrderedDict()   # normalized description -> items
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.cache_hits = 0
+        self.rule_hits = 0
+        self.llm_calls = 0
+
+    def _remember(self, key, items):
+        with self._lock:
+            self._cache[key] = items
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def quick_extract(self, description):
+        """Items from the cache or the rules, or None if the LLM is needed"""
+        key = normalize_description(description)
+        with self._lock:
+            self.requests += 1
+            items = self._cache.get(key)
+            if items is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return list(items)
+
+        items, coverage = rule_extract(description)
+        if items and coverage >= self.min_coverage:
+            with self._lock:
+                self.rule_hits += 1
+            self._remember(key, items)
+            return list(items)
+        return None
+
+    def llm_extract(self, llm, description):
+        """Extract with the LLM and cache the result"""
+        with self._lock:
+            self.llm_calls += 1
+        items = extract_food_choices(llm, description)
+        items = items if isinstance(items, list) else []
+        if items:  # an empty answer may be a bad generation; don't pin it
+            self._remember(normalize_description(description), items)
+        return list(items)
+
+    def extract(self, llm, description):
+        """Food items liked in `description`, calling the LLM only if needed"""
+        items = self.quick_extract(description)
+        if items is None:
+            items = self.llm_extract(llm, description)
+        return items
+
+    def stats(self):
+        with self._lock:
+            skipped = self.cache_hits + self.rule_hits
+            return {
+                "requests": self.requests,
+                "cacheHits": self.cache_hits,
+                "ruleHits": self.rule_hits,
+                "llmCalls": self.llm_calls,
+                "cacheHitRate": round(self.cache_hits / self.requests, 3) if self.requests else 0.0,
+                "llmSkipRate": round(skipped / self.requests, 3) if self.requests else 0.0,
+                "cacheSize": len(self._cache),
+            }
+
+
+_extractor = None
+_extractor_lock = threading.Lock()
+
+
+def get_food_extractor():
+    """Process-wide food extractor"""
+    global _extractor
+    with _extractor_lock:
+        if _extractor is None:
+            _extractor = FoodExtractor()
+        return _extractor
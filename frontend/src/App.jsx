@@ -11,6 +11,7 @@ function App() {
   const [foodInput, setFoodInput] = useState('')
   const [foodChoices, setFoodChoices] = useState([])
   const [matches, setMatches] = useState([])
+  const [reasons, setReasons] = useState({})
   const [isCalculating, setIsCalculating] = useState(false)
   const [error, setError] = useState('')
 
@@ -82,7 +83,7 @@ function App() {
     }
   }
 
-  const handleCalculateMatches = async () => {
+  const handleCalculateMatches = () => {
     if (foodChoices.length === 0) {
       setError('Please add some food preferences first')
       return
@@ -90,29 +91,66 @@ function App() {
 
     setIsCalculating(true)
     setError('')
+    setReasons({})
 
-    try {
-      const response = await fetch(`${API_URL}/calculate-matches`, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ name: userName })
-      })
+    // Server-Sent Events: the quick ranking arrives first, then each
+    // candidate is replaced by its LLM-refined result as it completes
+    const source = new EventSource(
+      `${API_URL}/calculate-matches/stream?name=${encodeURIComponent(userName)}`
+    )
+    let current = []
+
+    const showTopMatches = (list) => {
+      current = list
+      setMatches([...list].sort((a, b) => b.score - a.score).slice(0, 3))
+    }
+
+    const finish = () => {
+      source.close()
+      setIsCalculating(false)
+    }
+
+    source.addEventListener('ranking', (e) => {
+      showTopMatches(JSON.parse(e.data).matches)
+    })
+
+    source.addEventListener('refined', (e) => {
+      const refined = JSON.parse(e.data).match
+      showTopMatches(current.map((m) => (m.name === refined.name ? refined : m)))
+    })
 
+    source.addEventListener('done', (e) => {
+      setMatches(JSON.parse(e.data).matches)
+      finish()
+    })
+
+    source.addEventListener('error', (e) => {
+      // Error events from the server carry a message; connection errors don't
+      setError(e.data
+        ? JSON.parse(e.data).error || 'Failed to calculate matches'
+        : 'Failed to calculate matches. Make sure the backend is running.')
+      console.error(e)
+      setMatches([])
+      finish()
+    })
+  }
+
+  // Scoring skips the LLM's explanation; fetch it only for the matches
+  // the user asks about (generated once per pair, then cached server-side)
+  const handleShowReason = async (matchName) => {
+    setReasons((prev) => ({ ...prev, [matchName]: null }))
+    let reason = 'Could not explain this match right now. Please try again.'
+    try {
+      const response = await fetch(
+        `${API_URL}/match-reason?a=${encodeURIComponent(userName)}&b=${encodeURIComponent(matchName)}`
+      )
       const data = await response.json()
-      
-      if (data.success) {
-        setMatches(data.matches)
-      } else {
-        setError(data.error || 'Failed to calculate matches')
-        setMatches([])
-      }
+      if (response.ok) reason = data.reason
+      else if (data.error) reason = data.error
     } catch (err) {
-      setError('Failed to calculate matches. Make sure the backend is running.')
-      console.error(err)
-      setMatches([])
-    } finally {
-      setIsCalculating(false)
+      console.error('Failed to fetch match reason:', err)
     }
+    setReasons((prev) => ({ ...prev, [matchName]: reason }))
   }
 
   const handleLogout = () => {
@@ -120,6 +158,7 @@ function App() {
     setUserName('')
     setFoodChoices([])
     setMatches([])
+    setReasons({})
     setError('')
   }
 
@@ -234,10 +273,18 @@ function App() {
                       <strong>Similar tastes:</strong> {match.keywordHits.join(', ')}
                     </div>
                   )}
-                  {match.llmReason && (
+                  {match.llmReason || reasons[match.name] ? (
                     <div className="llm-reason">
-                      <strong>AI Analysis:</strong> {match.llmReason}
+                      <strong>AI Analysis:</strong> {match.llmReason || reasons[match.name]}
                     </div>
+                  ) : !isCalculating && (
+                    <button
+                      onClick={() => handleShowReason(match.name)}
+                      disabled={match.name in reasons}
+                      className="btn-secondary btn-reason"
+                    >
+                      {match.name in reasons ? 'Thinking...' : '💬 Why this match?'}
+                    </button>
                   )}
                 </div>
               ))}
@@ -0,0 +1,67 @@
+# gunicorn.conf.py
+"""
+Production server settings for Food-Friend
+
+    gunicorn -c gunicorn.conf.py api_server:app
+
+Pre-forks SERVER_WORKERS processes with SERVER_THREADS request threads each
+(values from config.py, overridable in .env). The master maps the GGUF
+model once before forking; each worker then loads the app and its own
+llama.cpp contexts, which map the same page-cache pages. On SIGTERM a
+worker stops accepting, finishes in-flight requests and drains LLM calls
+and match jobs for up to SERVER_GRACEFUL_TIMEOUT seconds.
+"""
+
+import os
+import sys
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from config import (
+    MODEL_PATH,
+    EMBEDDING_MODEL_PATH,
+    SERVER_BIND,
+    SERVER_WORKERS,
+    SERVER_THREADS,
+    SERVER_TIMEOUT,
+    SERVER_GRACEFUL_TIMEOUT,
+)
+from llm_pool import map_model_file
+
+bind = SERVER_BIND
+workers = SERVER_WORKERS
+threads = SERVER_THREADS
+worker_class = "gthread"
+timeout = SERVER_TIMEOUT
+graceful_timeout = SERVER_GRACEFUL_TIMEOUT
+
+# Workers import the app after forking: llama.cpp contexts and the app's
+# background threads (model loader, write coalescing, match jobs) don't
+# survive a fork
+preload_app = False
+
+# Each worker's LLM pool gets an equal share of LLM_THREADS
+os.environ["FOODFRIEND_SERVER_PROCESSES"] = str(workers)
+
+_model_maps = []
+
+
+def on_starting(server):
+    """Map the model file(s) once in the master so workers share the pages"""
+    for path in dict.fromkeys([MODEL_PATH, EMBEDDING_MODEL_PATH]):
+        mapped = map_model_file(path)
+        if mapped is None:
+            server.log.warning("Model file %s not found; workers will retry loading", path)
+            continue
+        _model_maps.append(mapped)
+        server.log.info("Mapped %s (%.0f MiB) for %d workers",
+                        path, len(mapped) / 2**20, workers)
+
+
+def worker_exit(server, worker):
+    """Drain LLM calls and match jobs before the worker process exits"""
+    api_server = sys.modules.get("api_server")
+    if api_server is not None:
+        api_server.shutdown(SERVER_GRACEFUL_TIMEOUT)
@@ -0,0 +1,126 @@
+# llm_cache.py
+"""
+Persistent cache of LLM pair scores
+Results are keyed by both users' food lists (order-independent), kept in an
+in-memory LRU and in a local SQLite file that survives restarts
+"""
+
+import json
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+from config import MODEL_PATH, LLM_CACHE_PATH, LLM_CACHE_MEMORY_SIZE
+
+
+def prompt_version(template):
+    """Short fingerprint of a prompt template; editing the prompt changes it"""
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()[:12]
+
+
+def canonical_foods(food_choices):
+    """Lowercased, stripped, de-duplicated and sorted food list"""
+    return sorted({f.strip().lower() for f in food_choices if f.strip()})
+
+
+def pair_key(kind, foods_a, foods_b):
+    """
+    Cache key for a pair of food lists. The two canonical lists are sorted
+    before hashing, so (A, B) and (B, A) share one entry.
+    """
+    pair = sorted([canonical_foods(foods_a), canonical_foods(foods_b)])
+    raw = json.dumps([kind, pair], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class PairScoreCache:
+    """
+    Two-tier cache of LLM pair results.
+    Every entry records the model path and prompt version it was produced
+    with; entries from another model or prompt are treated as misses and
+    purged when the cache is opened.
+    """
+
+    def __init__(self, path=LLM_CACHE_PATH, memory_size=LLM_CACHE_MEMORY_SIZE,
+                 model=str(MODEL_PATH)):
+        self.model = model
+        self.memory_size = memory_size
+        self._memory = OrderedDict()  # (key, version) -> json text
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS pair_scores (
+                   key TEXT PRIMARY KEY,
+                   model TEXT NOT NULL,
+                   prompt_version TEXT NOT NULL,
+                   result TEXT NOT NULL
+               )"""
+        )
+        self._db.execute("DELETE FROM pair_scores WHERE model != ?", (model,))
+        self._db.commit()
+
+    def _remember(self, mem_key, text):
+        self._memory[mem_key] = text
+        self._memory.move_to_end(mem_key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, kind, template, foods_a, foods_b):
+        """Cached result dict for this pair, or None"""
+        key = pair_key(kind, foods_a, foods_b)
+        version = prompt_version(template)
+        mem_key = (key, version)
+
+        with self._lock:
+            text = self._memory.get(mem_key)
+            if text is not None:
+                self._memory.move_to_end(mem_key)
+            else:
+                row = self._db.execute(
+                    "SELECT result FROM pair_scores "
+                    "WHERE key = ? AND model = ? AND prompt_version = ?",
+                    (key, self.model, version),
+                ).fetchone()
+                if row:
+                    text = row[0]
+                    self._remember(mem_key, text)
+
+            if text is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(text)
+
+    def put(self, kind, template, foods_a, foods_b, result):
+        """Store a result dict for this pair (replacing any stale entry)"""
+        key = pair_key(kind, foods_a, foods_b)
+        version = prompt_version(template)
+        text = json.dumps(result, ensure_ascii=False)
+
+        with self._lock:
+            self._remember((key, version), text)
+            self._db.execute(
+                "INSERT OR REPLACE INTO pair_scores (key, model, prompt_version, result) "
+                "VALUES (?, ?, ?, ?)",
+                (key, self.model, version, text),
+            )
+            self._db.commit()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_pair_cache():
+    """Process-wide pair score cache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = PairScoreCache()
+        return _cache
@@ -1,12 +1,57 @@
 # llm_full_matcher.py
 import json
 import re
+import time
+from llama_cpp import LlamaGrammar
+from llm_cache import get_pair_cache
+from metrics import record_llm
 
+# Fixed instructions come first and the user-specific part last, so the
+# llama.cpp prompt cache can reuse the evaluated instruction prefix
 FULL_MATCH_PROMPT = """Analyze food compatibility between two people.
 
+Consider cuisine types, flavor profiles, and specific dishes.
+
+Rate compatibility 0-100:
+- 0-20: Very different tastes
+- 20-40: Some differences
+- 40-60: Moderate match
+- 60-80: Good match
+- 80-100: Excellent match
+
+Respond with ONLY this JSON (no other text):
+{{"score": 75, "reason": "Both enjoy Italian and Asian cuisines with pasta overlap"}}
+
 User A likes: {foods_a}
 User B likes: {foods_b}
 
+JSON:
+"""
+
+CACHE_KIND = "full_match"
+
+# Longest reason the grammar lets the model write
+REASON_MAX_CHARS = 160
+
+# Enough for the longest grammatical answer (~50 tokens) with headroom
+FULL_MATCH_MAX_TOKENS = 80
+
+FULL_MATCH_GRAMMAR = r"""
+root   ::= "{" ws "\"score\"" ws ":" ws score ws "," ws "\"reason\"" ws ":" ws reason ws "}"
+score  ::= "100" | [1-9] [0-9]? | "0"
+reason ::= "\"" char{1,%d} "\""
+char   ::= [^"\\\x00-\x1f]
+ws     ::= " "?
+""" % REASON_MAX_CHARS
+
+_grammar = None
+
+
+# --------------------------------------------------------
+# Score-only scoring: reasons are generated later, on demand
+# --------------------------------------------------------
+SCORE_PROMPT = """Analyze food compatibility between two people.
+
 Consider cuisine types, flavor profiles, and specific dishes.
 
 Rate compatibility 0-100:
@@ -17,85 +62,420 @@ Rate compatibility 0-100:
 - 80-100: Excellent match
 
 Respond with ONLY this JSON (no other text):
-{{"score": 75, "reason": "Both enjoy Italian and Asian cuisines with pasta overlap"}}
+{{"score": 75}}
+
+User A likes: {foods_a}
+User B likes: {foods_b}
+
+JSON:
+"""
+
+SCORE_CACHE_KIND = "score"
+
+# {"score": 100} is 6-8 tokens
+SCORE_MAX_TOKENS = 12
+
+SCORE_GRAMMAR = r"""
+root   ::= "{" ws "\"score\"" ws ":" ws score ws "}"
+score  ::= "100" | [1-9] [0-9]? | "0"
+ws     ::= " "?
+"""
+
+REASON_PROMPT = """Explain the food compatibility between two people in one short sentence.
+
+Mention the cuisines, flavors or dishes they share, or how their tastes differ.
+
+Respond with ONLY this JSON (no other text):
+{{"reason": "Both enjoy Italian and Asian cuisines with pasta overlap"}}
+
+User A likes: {foods_a}
+User B likes: {foods_b}
+
+JSON:
 """
 
+REASON_CACHE_KIND = "reason"
+
+# Enough for the longest grammatical reason (~45 tokens) with headroom
+REASON_MAX_TOKENS = 64
+
+REASON_GRAMMAR = r"""
+root   ::= "{" ws "\"reason\"" ws ":" ws reason ws "}"
+reason ::= "\"" char{1,%d} "\""
+char   ::= [^"\\\x00-\x1f]
+ws     ::= " "?
+""" % REASON_MAX_CHARS
+
+_score_grammar = None
+_reason_grammar = None
+
+# Completion tokens generated by single-pair calls (for measuring output size)
+GENERATION_STATS = {"calls": 0, "completion_tokens": 0}
+
+
+def full_match_grammar():
+    """Compiled FULL_MATCH_GRAMMAR (built on first use)"""
+    global _grammar
+    if _grammar is None:
+        _grammar = LlamaGrammar.from_string(FULL_MATCH_GRAMMAR, verbose=False)
+    return _grammar
+
+
+def score_grammar():
+    """Compiled SCORE_GRAMMAR (built on first use)"""
+    global _score_grammar
+    if _score_grammar is None:
+        _score_grammar = LlamaGrammar.from_string(SCORE_GRAMMAR, verbose=False)
+    return _score_grammar
+
+
+def reason_grammar():
+    """Compiled REASON_GRAMMAR (built on first use)"""
+    global _reason_grammar
+    if _reason_grammar is None:
+        _reason_grammar = LlamaGrammar.from_string(REASON_GRAMMAR, verbose=False)
+    return _reason_grammar
+
+
+def _record_generation(out, seconds, kind="full_match"):
+    usage = out.get("usage") or {}
+    GENERATION_STATS["calls"] += 1
+    GENERATION_STATS["completion_tokens"] += usage.get("completion_tokens", 0)
+    record_llm(kind, seconds, usage.get("prompt_tokens"), usage.get("completion_tokens"))
+
+
+def _cache_result(choices_a, choices_b, result, kind=CACHE_KIND, template=FULL_MATCH_PROMPT):
+    """Remember a parsed model answer so this pair is never re-scored"""
+    get_pair_cache().put(kind, template, choices_a, choices_b, result)
+    return result
+
+
+def _cached(choices_a, choices_b, entries):
+    """First cached result for this pair among (kind, template) entries, or None"""
+    cache = get_pair_cache()
+    for kind, template in entries:
+        cached = cache.get(kind, template, choices_a, choices_b)
+        if cached is not None:
+            return cached
+    return None
+
+
 def llm_full_match(llm, userA, userB):
-    foods_a = ", ".join(userA.get("foodChoices", []))
-    foods_b = ", ".join(userB.get("foodChoices", []))
+    choices_a = userA.get("foodChoices", [])
+    choices_b = userB.get("foodChoices", [])
+    foods_a = ", ".join(choices_a)
+    foods_b = ", ".join(choices_b)
     
     if not foods_a or not foods_b:
         return {"score": 0, "reason": "Missing food preferences"}
     
+    # Unchanged food lists → reuse the earlier answer (either order)
+    cached = get_pair_cache().get(CACHE_KIND, FULL_MATCH_PROMPT, choices_a, choices_b)
+    if cached is not None:
+        return cached
+    
     prompt = FULL_MATCH_PROMPT.format(foods_a=foods_a, foods_b=foods_b)
 
     try:
-        out = llm(prompt, max_tokens=120, temperature=0.3, stop=["}", "\n\n"])
+        # The grammar only admits {"score": 0-100, "reason": "..."}, and
+        # generation ends as soon as its closing brace is produced
+        start = time.perf_counter()
+        out = llm(prompt, max_tokens=FULL_MATCH_MAX_TOKENS, temperature=0.3,
+                  grammar=full_match_grammar())
+        _record_generation(out, time.perf_counter() - start)
         raw = out["choices"][0]["text"].strip()
         
-        # Add closing brace if missing
-        if raw and not raw.endswith("}"):
-            raw += "}"
-        
         print(f"🤖 LLM raw: {raw[:80]}...")  # Debug output
         
-        # Strategy 1: Look for complete JSON with both fields
-        match = re.search(r'\{\s*"score"\s*:\s*(\d+)\s*,\s*"reason"\s*:\s*"([^"]*)"', raw)
-        if match:
-            score = int(match.group(1))
-            reason = match.group(2)
-            score = max(0, min(100, score))
-            print(f"✅ Parsed: {score}% - {reason[:40]}")
-            return {"score": score, "reason": reason}
-        
-        # Strategy 2: Try full JSON parse
-        json_match = re.search(r'\{[^}]*\}', raw, re.DOTALL)
-        if json_match:
-            try:
-                data = json.loads(json_match.group(0))
-                if "score" in data:
-                    score = int(data.get("score", 50))
-                    score = max(0, min(100, score))
-                    reason = data.get("reason", "Compatible food preferences")
-                    print(f"✅ JSON parsed: {score}%")
-                    return {"score": score, "reason": reason}
-            except:
-                pass
+        data = json.loads(raw)
+        score = max(0, min(100, int(data["score"])))
+        reason = data["reason"]
+        print(f"✅ Parsed: {score}% - {reason[:40]}")
+        return _cache_result(choices_a, choices_b, {"score": score, "reason": reason})
         
-        # Strategy 3: Extract score from any number found
-        score_match = re.search(r'(?:score|compatibility|match)[:\s]*(\d+)', raw, re.IGNORECASE)
-        if score_match:
-            score = int(score_match.group(1))
-            score = max(0, min(100, score))
-            # Try to find any descriptive text
-            reason_match = re.search(r'(?:reason|because|analysis)[:\s]*["\']?([^"\'\n]{10,100})', raw, re.IGNORECASE)
-            reason = reason_match.group(1).strip() if reason_match else "Based on food preferences"
-            print(f"⚠️ Fuzzy parse: {score}%")
-            return {"score": score, "reason": reason}
+    except Exception as e:
+        # Only reachable if generation was cut off or the model failed;
+        # no made-up score, the hybrid matcher falls back to Python scoring
+        print(f"❌ LLM error: {e}")
+        return {"score": None, "reason": ""}
+
+
+def llm_score_match(llm, userA, userB):
+    """
+    llm_full_match without the reason: generation stops right after the
+    score. The reason is "" unless this pair already has one cached;
+    llm_match_reason writes it on demand.
+    """
+    choices_a = userA.get("foodChoices", [])
+    choices_b = userB.get("foodChoices", [])
+    foods_a = ", ".join(choices_a)
+    foods_b = ", ".join(choices_b)
+    
+    if not foods_a or not foods_b:
+        return {"score": 0, "reason": "Missing food preferences"}
+    
+    cached = _cached(choices_a, choices_b, SCORE_ENTRIES)
+    if cached is not None:
+        return cached
+    
+    prompt = SCORE_PROMPT.format(foods_a=foods_a, foods_b=foods_b)
+
+    try:
+        start = time.perf_counter()
+        out = llm(prompt, max_tokens=SCORE_MAX_TOKENS, temperature=0.3,
+                  grammar=score_grammar())
+        _record_generation(out, time.perf_counter() - start, "score")
+        raw = out["choices"][0]["text"].strip()
         
-        # Strategy 4: Fallback - analyze overlap manually
-        print(f"⚠️ All parsing failed, using overlap analysis")
-        foods_a_set = set(f.lower().strip() for f in foods_a.split(","))
-        foods_b_set = set(f.lower().strip() for f in foods_b.split(","))
-        overlap = foods_a_set & foods_b_set
+        score = max(0, min(100, int(json.loads(raw)["score"])))
+        print(f"✅ Parsed: {score}%")
+        return _cache_result(choices_a, choices_b, {"score": score, "reason": ""},
+                             SCORE_CACHE_KIND, SCORE_PROMPT)
         
-        if overlap:
-            score = min(80, 40 + len(overlap) * 10)
-            reason = f"Share interest in {', '.join(list(overlap)[:3])}"
+    except Exception as e:
+        print(f"❌ LLM error: {e}")
+        return {"score": None, "reason": ""}
+
+
+# --------------------------------------------------------
+# Batched scoring: one user against several candidates
+# --------------------------------------------------------
+BATCH_MATCH_PROMPT = """Analyze food compatibility between one person and several candidates.
+
+Consider cuisine types, flavor profiles, and specific dishes.
+
+Rate each candidate's compatibility with the user 0-100:
+- 0-20: Very different tastes
+- 20-40: Some differences
+- 40-60: Moderate match
+- 60-80: Good match
+- 80-100: Excellent match
+
+Respond with ONLY one JSON object per candidate, one per line, in order (no other text):
+{{"id": 1, "score": 75, "reason": "Both enjoy Italian and Asian cuisines with pasta overlap"}}
+
+User likes: {foods_user}
+
+Candidates:
+{candidate_lines}
+
+JSON:
+"""
+
+BATCH_SCORE_PROMPT = """Analyze food compatibility between one person and several candidates.
+
+Consider cuisine types, flavor profiles, and specific dishes.
+
+Rate each candidate's compatibility with the user 0-100:
+- 0-20: Very different tastes
+- 20-40: Some differences
+- 40-60: Moderate match
+- 60-80: Good match
+- 80-100: Excellent match
+
+Respond with ONLY one JSON object per candidate, one per line, in order (no other text):
+{{"id": 1, "score": 75}}
+
+User likes: {foods_user}
+
+Candidates:
+{candidate_lines}
+
+JSON:
+"""
+
+# Generation budget per candidate in a batch
+BATCH_TOKENS_PER_CANDIDATE = 60
+BATCH_SCORE_TOKENS_PER_CANDIDATE = 20
+
+# Cached answers that carry a score, best first: full answers (which also
+# hold a reason), then score-only ones
+FULL_ENTRIES = [(CACHE_KIND, FULL_MATCH_PROMPT), (CACHE_KIND, BATCH_MATCH_PROMPT)]
+SCORE_ENTRIES = FULL_ENTRIES + [(SCORE_CACHE_KIND, SCORE_PROMPT),
+                                (SCORE_CACHE_KIND, BATCH_SCORE_PROMPT)]
+
+
+# One line per candidate, ids 1..count in order, so the answer ends
+# after the last candidate's closing brace
+BATCH_GRAMMAR = r"""
+root   ::= %s
+score  ::= "100" | [1-9] [0-9]? | "0"
+reason ::= "\"" char{1,%d} "\""
+char   ::= [^"\\\x00-\x1f]
+ws     ::= " "?
+"""
+BATCH_GRAMMAR_LINE = r'"{" ws "\"id\"" ws ":" ws "%d" ws "," ws "\"score\"" ws ":" ws score%s ws "}"'
+BATCH_GRAMMAR_REASON = r' ws "," ws "\"reason\"" ws ":" ws reason'
+
+_batch_grammars = {}  # (count, reasons) -> compiled grammar
+
+
+def batch_grammar(count, reasons=True):
+    """Compiled BATCH_GRAMMAR for `count` candidates (built on first use)"""
+    key = (count, reasons)
+    if key not in _batch_grammars:
+        tail = BATCH_GRAMMAR_REASON if reasons else ""
+        lines = ' "\n" '.join(BATCH_GRAMMAR_LINE % (i, tail) for i in range(1, count + 1))
+        _batch_grammars[key] = LlamaGrammar.from_string(
+            BATCH_GRAMMAR % (lines, REASON_MAX_CHARS), verbose=False)
+    return _batch_grammars[key]
+
+
+_BATCH_OBJECT = re.compile(r'\{[^{}]*\}')
+
+
+def _parse_batch_entry(obj, count, reasons=True):
+    """
+    (candidate id, {"score", "reason"}) for one well-formed JSON line, else
+    None. Without `reasons` the line carries no reason and it is set to "".
+    """
+    try:
+        data = json.loads(obj)
+        cid = int(data["id"])
+        score = int(data["score"])
+    except (ValueError, KeyError, TypeError):
+        return None
+    reason = data.get("reason") if reasons else ""
+    if not 1 <= cid <= count or not isinstance(reason, str):
+        return None
+    return cid, {"score": max(0, min(100, score)), "reason": reason}
+
+
+def _stream_batch(llm, prompt, count, reasons=True):
+    """
+    Run a batch prompt with streaming and yield (candidate id, result) as
+    soon as each candidate's JSON line is complete. The grammar only
+    admits `count` lines, and generation is abandoned once every
+    candidate has been parsed.
+    """
+    per_candidate = BATCH_TOKENS_PER_CANDIDATE if reasons else BATCH_SCORE_TOKENS_PER_CANDIDATE
+    text = ""
+    pos = 0
+    seen = set()
+    chunks = 0
+    first_token = None
+    start = time.perf_counter()
+    try:
+        for chunk in llm(prompt, max_tokens=per_candidate * count, temperature=0.3,
+                         stream=True, grammar=batch_grammar(count, reasons)):
+            if first_token is None:
+                first_token = time.perf_counter() - start
+            chunks += 1  # llama.cpp streams one token per chunk
+            text += chunk["choices"][0]["text"]
+            for m in _BATCH_OBJECT.finditer(text, pos):
+                pos = m.end()
+                entry = _parse_batch_entry(m.group(0), count, reasons)
+                if entry and entry[0] not in seen:
+                    seen.add(entry[0])
+                    yield entry
+            if len(seen) == count:
+                break
+    finally:
+        # Streamed chunks carry no usage, so count the prompt separately
+        record_llm("batch" if reasons else "batch_score", time.perf_counter() - start,
+                   len(llm.tokenize(prompt.encode("utf-8"))), chunks, first_token)
+
+
+def llm_batch_match_iter(llm, user, candidates, reasons=True):
+    """
+    Score `user` against every candidate with a single prompt, yielding
+    (index, {"score", "reason"}) as each result becomes available: cached
+    pairs first, then each candidate as the streamed batch answer reaches
+    it. Candidates whose line is missing or malformed fall back to
+    llm_full_match individually at the end.
+    Without `reasons` only scores are generated (BATCH_SCORE_PROMPT, then
+    llm_score_match); reasons come from the cache or stay "".
+    """
+    choices_user = user.get("foodChoices", [])
+    cache = get_pair_cache()
+    if reasons:
+        kind, template, entries, single = CACHE_KIND, BATCH_MATCH_PROMPT, FULL_ENTRIES, llm_full_match
+    else:
+        kind, template, entries, single = (SCORE_CACHE_KIND, BATCH_SCORE_PROMPT,
+                                           SCORE_ENTRIES, llm_score_match)
+
+    done = set()
+    pending = []
+    for i, other in enumerate(candidates):
+        choices = other.get("foodChoices", [])
+        if not choices_user or not choices:
+            done.add(i)
+            yield i, {"score": 0, "reason": "Missing food preferences"}
+            continue
+        cached = _cached(choices_user, choices, entries)
+        if cached is not None:
+            done.add(i)
+            yield i, cached
         else:
-            score = 30
-            reason = "Different food preferences but may discover new tastes"
-        
-        return {"score": score, "reason": reason}
+            pending.append(i)
+
+    if len(pending) > 1:
+        candidate_lines = "\n".join(
+            f"{n}: {', '.join(candidates[i]['foodChoices'])}"
+            for n, i in enumerate(pending, start=1)
+        )
+        prompt = template.format(
+            foods_user=", ".join(choices_user), candidate_lines=candidate_lines
+        )
+        parsed = 0
+        try:
+            for n, result in _stream_batch(llm, prompt, len(pending), reasons):
+                i = pending[n - 1]
+                cache.put(kind, template, choices_user,
+                          candidates[i]["foodChoices"], result)
+                done.add(i)
+                parsed += 1
+                yield i, result
+        except Exception as e:
+            print(f"❌ LLM batch error: {e}")
+        print(f"✅ Batch parsed {parsed}/{len(pending)} candidates")
+
+    # Single pending pair, or entries the batch answer got wrong
+    for i, other in enumerate(candidates):
+        if i not in done:
+            yield i, single(llm, user, other)
+
+
+# --------------------------------------------------------
+# Match reasons on demand
+# --------------------------------------------------------
+REASON_ENTRIES = FULL_ENTRIES + [(REASON_CACHE_KIND, REASON_PROMPT)]
+
+
+def cached_match_reason(userA, userB):
+    """This pair's reason from any earlier answer, or None (no LLM needed)"""
+    choices_a = userA.get("foodChoices", [])
+    choices_b = userB.get("foodChoices", [])
+    if not choices_a or not choices_b:
+        return "Missing food preferences"
+    cached = _cached(choices_a, choices_b, REASON_ENTRIES)
+    return cached["reason"] if cached is not None else None
+
+
+def llm_match_reason(llm, userA, userB):
+    """
+    One-sentence reason why two users' tastes match (or don't), generated
+    on first request and cached by food lists like the scores.
+    None if generation failed.
+    """
+    reason = cached_match_reason(userA, userB)
+    if reason is not None:
+        return reason
+    
+    choices_a = userA["foodChoices"]
+    choices_b = userB["foodChoices"]
+    prompt = REASON_PROMPT.format(foods_a=", ".join(choices_a), foods_b=", ".join(choices_b))
+
+    try:
+        start = time.perf_counter()
+        out = llm(prompt, max_tokens=REASON_MAX_TOKENS, temperature=0.3,
+                  grammar=reason_grammar())
+        _record_generation(out, time.perf_counter() - start, "reason")
+        reason = json.loads(out["choices"][0]["text"].strip())["reason"]
+        print(f"✅ Reason: {reason[:40]}")
+        _cache_result(choices_a, choices_b, {"reason": reason}, REASON_CACHE_KIND, REASON_PROMPT)
+        return reason
         
     except Exception as e:
         print(f"❌ LLM error: {e}")
-        # Last resort: simple overlap
-        try:
-            foods_a_set = set(f.lower().strip() for f in foods_a.split(","))
-            foods_b_set = set(f.lower().strip() for f in foods_b.split(","))
-            overlap = foods_a_set & foods_b_set
-            score = min(70, 30 + len(overlap) * 15)
-            return {"score": score, "reason": "Automatic compatibility analysis"}
-        except:
-            return {"score": 50, "reason": "Analysis completed"}
+        return None
@@ -1,24 +1,68 @@
 # llm_hybrid_matcher.py
 import json
-from llm_full_matcher import llm_full_match
+from llm_full_matcher import llm_full_match, llm_score_match, llm_batch_match_iter
 from match_engine import score_pair
+from config import HYBRID_PYTHON_WEIGHT, MATCH_REASONS
 
-def llm_hybrid_match(llm, userA, userB):
-    python_result = score_pair(userA, userB)
+def _combine(python_result, llm_result=None, embedding_score=None):
     python_score = python_result["score"]
+    llm_score = llm_result["score"] if llm_result else None
 
-    llm_result = llm_full_match(llm, userA, userB)
-    llm_score = llm_result["score"]
-
-    final_score = int(0.6 * python_score + 0.4 * llm_score)
+    # Semantic part: the LLM's score, else the embedding similarity;
+    # with neither, rank on the Python score alone
+    semantic_score = llm_score if llm_score is not None else embedding_score
+    if semantic_score is None:
+        final_score = python_score
+    else:
+        final_score = int(HYBRID_PYTHON_WEIGHT * python_score
+                          + (1 - HYBRID_PYTHON_WEIGHT) * semantic_score)
     final_score = max(0, min(100, final_score))
 
     return {
         "final_score": final_score,
         "python_score": python_score,
         "llm_score": llm_score,
-        "reason": llm_result["reason"],
+        "embedding_score": embedding_score,
+        "reason": llm_result["reason"] if llm_result else "",
         "matched_cuisines": python_result["matched_cuisines"],
         "shared_exact": python_result["shared_exact"],
         "keyword_hits": python_result["keyword_hits"],
     }
+
+def llm_hybrid_match(llm, userA, userB):
+    python_result = score_pair(userA, userB)
+    if MATCH_REASONS == "inline":
+        llm_result = llm_full_match(llm, userA, userB)
+    else:
+        llm_result = llm_score_match(llm, userA, userB)
+    return _combine(python_result, llm_result)
+
+def llm_hybrid_match_iter(llm, user, candidates):
+    """
+    llm_hybrid_match for several candidates, with all LLM scoring done in
+    one batched prompt, yielding (index, result) as each candidate's LLM
+    score arrives. `candidates` is a list of (other, score_pair result).
+    With MATCH_REASONS = "lazy" only scores are generated.
+    """
+    others = [other for other, _ in candidates]
+    for i, llm_result in llm_batch_match_iter(llm, user, others,
+                                              reasons=MATCH_REASONS == "inline"):
+        yield i, _combine(candidates[i][1], llm_result)
+
+def embedding_hybrid_match_many(embedder, user, candidates, embed=None):
+    """
+    Hybrid scores for several candidates with the embedding tier as the
+    semantic part: no text generation, so no reasons. `candidates` is a
+    list of (other, score_pair result); `embed` embeds unseen food items.
+    """
+    # Embed every unseen item of the group in one call
+    items = list(user.get("foodChoices", []))
+    for other, _ in candidates:
+        items.extend(other.get("foodChoices", []))
+    embedder.item_vectors(items, embed)
+
+    return [
+        _combine(python_result, embedding_score=embedder.similarity(
+            user.get("foodChoices", []), other.get("foodChoices", []), embed))
+        for other, python_result in candidates
+    ]
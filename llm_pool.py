@@ -0,0 +1,173 @@
+# llm_pool.py
+"""
+Pool of llama.cpp model instances for concurrent requests
+A llama.cpp context must not be used by two threads at once, so each request
+checks out its own instance (waiting up to a timeout) and returns it after.
+The model file is memory-mapped, so the instances share the weights in RAM.
+"""
+
+import mmap
+import time
+import queue
+import threading
+from contextlib import contextmanager
+
+from config import (
+    LLM_POOL_SIZE,
+    LLM_POOL_TIMEOUT,
+    LLM_LOAD_RETRY_INITIAL,
+    LLM_LOAD_RETRY_MAX,
+    llm_thread_budget,
+)
+
+
+class LLMPoolTimeout(Exception):
+    """No model instance became free within the checkout timeout"""
+
+
+class LLMPool:
+    """
+    Fixed set of model instances, each running with its own slice of this
+    process's CPU threads (llm_thread_budget() // size), plus wait-time and
+    queue-depth metrics.
+    """
+
+    def __init__(self, size=LLM_POOL_SIZE, threads=None):
+        self.size = max(1, size)
+        self.threads_per_worker = max(1, (threads or llm_thread_budget()) // self.size)
+        self.loaded = 0
+        self.last_error = None
+        self.closed = False
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._returned = threading.Condition(self._lock)
+        self._waiting = 0
+        self._busy = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @property
+    def ready(self):
+        """True once at least one model instance is available"""
+        return self.loaded > 0
+
+    def add(self, llm):
+        """Register a loaded model instance with the pool"""
+        with self._lock:
+            self.loaded += 1
+        self._idle.put(llm)
+
+    def load(self, loader):
+        """Create the pool's instances with `loader(n_threads=...)`"""
+        while self.loaded < self.size:
+            self.add(loader(n_threads=self.threads_per_worker))
+
+    def load_in_background(self, loader, retry_initial=LLM_LOAD_RETRY_INITIAL,
+                           retry_max=LLM_LOAD_RETRY_MAX):
+        """
+        Load the pool's instances on a daemon thread so the server can answer
+        non-LLM requests right away. A failed load is retried with
+        exponential backoff (retry_initial, doubling up to retry_max seconds).
+        """
+        def run():
+            delay = retry_initial
+            while self.loaded < self.size and not self.closed:
+                try:
+                    self.add(loader(n_threads=self.threads_per_worker))
+                    self.last_error = None
+                    delay = retry_initial
+                    print(f"✅ LLM worker {self.loaded}/{self.size} loaded "
+                          f"({self.threads_per_worker} threads)")
+                except Exception as e:
+                    self.last_error = str(e)
+                    print(f"❌ Failed to load LLM: {e}")
+                    print(f"   Retrying in {delay:.0f}s")
+                    time.sleep(delay)
+                    delay = min(delay * 2, retry_max)
+
+        thread = threading.Thread(target=run, name="llm-loader", daemon=True)
+        thread.start()
+        return thread
+
+    @contextmanager
+    def checkout(self, timeout=LLM_POOL_TIMEOUT):
+        """Borrow a model instance for the duration of a `with` block"""
+        if self.closed:
+            raise LLMPoolTimeout("LLM pool is shutting down")
+        start = time.perf_counter()
+        with self._lock:
+            self._waiting += 1
+        try:
+            llm = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            with self._lock:
+                self._timeouts += 1
+            raise LLMPoolTimeout(f"No LLM worker free after {timeout}s")
+        finally:
+            waited = time.perf_counter() - start
+            with self._lock:
+                self._waiting -= 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+
+        with self._lock:
+            if self.closed:
+                self._idle.put(llm)
+                raise LLMPoolTimeout("LLM pool is shutting down")
+            self._busy += 1
+            self._checkouts += 1
+        try:
+            yield llm
+        finally:
+            with self._lock:
+                self._busy -= 1
+                self._returned.notify_all()
+            self._idle.put(llm)
+
+    def close(self, timeout=None):
+        """
+        Stop lending instances (new checkouts fail with LLMPoolTimeout) and
+        wait up to `timeout` seconds for the ones in use to come back.
+        Returns True when none is still busy.
+        """
+        with self._lock:
+            self.closed = True
+            return self._returned.wait_for(lambda: self._busy == 0, timeout)
+
+    def metrics(self):
+        """Current pool state and cumulative wait statistics"""
+        with self._lock:
+            attempts = self._checkouts + self._timeouts
+            return {
+                "size": self.size,
+                "loaded": self.loaded,
+                "lastLoadError": self.last_error,
+                "busy": self._busy,
+                "idle": self._idle.qsize(),
+                "queueDepth": self._waiting,
+                "threadsPerWorker": self.threads_per_worker,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "avgWaitMs": round(1000 * self._wait_total / attempts, 2) if attempts else 0.0,
+                "maxWaitMs": round(1000 * self._wait_max, 2),
+            }
+
+
+def map_model_file(path):
+    """
+    Map a GGUF file read-only and ask the OS to read it in. Processes that
+    later load the same file with use_mmap map the same page-cache pages,
+    so forked server workers hold the weights in RAM once. Returns the
+    mapping (keep it referenced), or None when the file doesn't exist.
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    with f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(mmap, "MADV_WILLNEED"):
+        mapped.madvise(mmap.MADV_WILLNEED)
+    return mapped
@@ -1,15 +1,27 @@
 # llm_utils.py
 import re
 import os
-from llama_cpp import Llama
+import time
+import string
+import numpy as np
+from llama_cpp import Llama, LlamaRAMCache
 from dotenv import load_dotenv
 from config import (
     MODEL_PATH,
     DEFAULT_CONTEXT_SIZE,
     DEFAULT_GPU_LAYERS,
     DEFAULT_PARAMS,
+    PROMPT_CACHE_BYTES,
+    LLM_USE_MMAP,
+    LLM_USE_MLOCK,
+    EMBEDDING_MODEL_PATH,
     check_model_exists
 )
+from llm_full_matcher import (
+    FULL_MATCH_PROMPT, BATCH_MATCH_PROMPT, SCORE_PROMPT, BATCH_SCORE_PROMPT, REASON_PROMPT,
+)
+from match_engine import SCORING_PROMPT
+from metrics import record_llm
 
 # Load environment variables
 load_dotenv()
@@ -24,18 +36,83 @@ Output format:
 Foods: item1, item2, item3
 """
 
-def load_llm():
+def static_prefix(template):
+    """Text of a prompt template before its first {placeholder}"""
+    prefix = ""
+    for literal, field, _, _ in string.Formatter().parse(template):
+        prefix += literal
+        if field is not None:
+            break
+    return prefix
+
+
+# Every prompt whose fixed instruction prefix is kept evaluated in the cache
+CACHED_PROMPTS = [EXTRACTION_PROMPT, FULL_MATCH_PROMPT, BATCH_MATCH_PROMPT, SCORING_PROMPT,
+                  SCORE_PROMPT, BATCH_SCORE_PROMPT, REASON_PROMPT]
+
+
+def warm_prompt_cache(llm, templates=CACHED_PROMPTS):
+    """
+    Evaluate each template's static prefix once and store the resulting
+    llama.cpp state in the model's cache. Later calls find the longest
+    cached token prefix of their prompt, restore that state and only
+    evaluate the user-specific remainder.
+    """
+    for template in templates:
+        tokens = llm.tokenize(static_prefix(template).encode("utf-8"))
+        llm.reset()
+        llm.eval(tokens)
+        llm.cache[tokens] = llm.save_state()
+    llm.reset()
+
+
+def load_llm(prompt_cache=True, n_threads=None):
     check_model_exists()
-    return Llama(
+    llm = Llama(
         model_path=str(MODEL_PATH),
         n_ctx=DEFAULT_CONTEXT_SIZE,
         n_gpu_layers=DEFAULT_GPU_LAYERS,
+        n_threads=n_threads,
+        use_mmap=LLM_USE_MMAP,
+        use_mlock=LLM_USE_MLOCK,
         verbose=False
     )
+    if prompt_cache and PROMPT_CACHE_BYTES > 0:
+        llm.set_cache(LlamaRAMCache(capacity_bytes=PROMPT_CACHE_BYTES))
+        warm_prompt_cache(llm)
+    return llm
+
+def load_embedder(n_threads=None):
+    """The GGUF model in embedding mode (EMBEDDING_MODEL_PATH)"""
+    if not EMBEDDING_MODEL_PATH.exists():
+        raise FileNotFoundError(f"Embedding model not found at: {EMBEDDING_MODEL_PATH}")
+    return Llama(
+        model_path=str(EMBEDDING_MODEL_PATH),
+        n_ctx=512,
+        n_gpu_layers=DEFAULT_GPU_LAYERS,
+        n_threads=n_threads,
+        use_mmap=LLM_USE_MMAP,
+        use_mlock=LLM_USE_MLOCK,
+        embedding=True,
+        verbose=False
+    )
+
+
+def embed_texts(llm, texts):
+    """
+    One float32 vector per text. Models without a pooling layer return a
+    vector per token; those are mean-pooled here.
+    """
+    start = time.perf_counter()
+    vectors = [np.asarray(v, dtype=np.float32) for v in llm.embed(list(texts))]
+    record_llm("embed", time.perf_counter() - start)
+    return [v.mean(axis=0) if v.ndim == 2 else v for v in vectors]
+
 
 def extract_food_choices(llm, text: str):
     prompt = EXTRACTION_PROMPT + f"\nUser: {text}\n\nExtract:\n"
 
+    start = time.perf_counter()
     output = llm(
         prompt,
         max_tokens=80,
@@ -44,6 +121,9 @@ def extract_food_choices(llm, text: str):
         top_k=DEFAULT_PARAMS["top_k"],
         repeat_penalty=DEFAULT_PARAMS["repeat_penalty"]
     )
+    usage = output.get("usage") or {}
+    record_llm("extract", time.perf_counter() - start,
+               usage.get("prompt_tokens"), usage.get("completion_tokens"))
 
     raw = output["choices"][0]["text"].strip()
 
@@ -0,0 +1,100 @@
+# match_cache.py
+"""
+In-memory cache of final match results for Food-Friend
+Repeated /api/calculate-matches calls for an unchanged user and population
+are answered from memory (or as 304 Not Modified) without loading the user,
+the top-k table or the LLM
+"""
+
+import os
+import json
+import hashlib
+import threading
+from functools import lru_cache
+from collections import OrderedDict
+
+from config import (
+    MODEL_PATH, EMBEDDING_MODEL_PATH, CANDIDATE_SEARCH, TOPK_SIZE,
+    ANN_CANDIDATES, ANN_NPROBE, ANN_EMBEDDING_WEIGHT,
+    HYBRID_PYTHON_WEIGHT, MATCH_RESULTS, MATCH_RESULT_CACHE_SIZE, MATCH_REASONS,
+)
+from match_engine import CUISINE_KEYWORDS, GENERAL_KEYWORDS
+
+
+def _model_id(path):
+    """A model file's path plus size and mtime, so replacing the file counts"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return str(path)
+    return f"{path}:{st.st_size}:{st.st_mtime_ns}"
+
+
+@lru_cache(maxsize=None)
+def ranking_version():
+    """
+    Fingerprint of the settings that shape Python-pass candidate lists:
+    the keyword rules, candidate search and the taste vectors' model
+    """
+    settings = [
+        CUISINE_KEYWORDS, GENERAL_KEYWORDS, CANDIDATE_SEARCH,
+        ANN_CANDIDATES, ANN_NPROBE, ANN_EMBEDDING_WEIGHT, _model_id(EMBEDDING_MODEL_PATH),
+    ]
+    return hashlib.sha256(json.dumps(settings).encode("utf-8")).hexdigest()[:12]
+
+
+@lru_cache(maxsize=None)
+def scoring_version(tier):
+    """
+    Fingerprint of the settings that shape match results; `tier` is the
+    semantic tier currently serving ("embedding" or "llm")
+    """
+    settings = [
+        ranking_version(), _model_id(MODEL_PATH), tier, TOPK_SIZE,
+        HYBRID_PYTHON_WEIGHT, MATCH_RESULTS, MATCH_REASONS,
+    ]
+    return hashlib.sha256(json.dumps(settings).encode("utf-8")).hexdigest()[:12]
+
+
+class MatchResultCache:
+    """
+    user key -> matches and their ETag, valid for one `version`.
+    Callers use (store version, scoring version): the store version moves
+    on every profile change, the user's own lastUpdated included, so a
+    matching version means neither side changed. Both parts are derived
+    from shared state, so server workers agree on the resulting ETags.
+    Least recently used entries are evicted beyond `size`.
+    """
+
+    def __init__(self, size=MATCH_RESULT_CACHE_SIZE):
+        self.size = size
+        self._entries = OrderedDict()  # key -> (version, etag, matches)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version):
+        """(etag, matches) cached for `key` under `version`, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key, version, last_updated, matches):
+        """Cache `matches` for `key`; returns their strong ETag"""
+        raw = json.dumps([version, last_updated, matches], sort_keys=True)
+        etag = hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+        with self._lock:
+            self._entries[key] = (version, etag, matches)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return etag
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
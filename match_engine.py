@@ -1,7 +1,13 @@
 # match_engine.py
 
 import re
-from config import DEFAULT_PARAMS
+import threading
+from functools import lru_cache
+
+import numpy as np
+
+from config import DEFAULT_PARAMS, FEATURE_CACHE_SIZE
+from llm_cache import get_pair_cache
 
 # --------------------------------------------------------
 # Cuisine keyword dictionary
@@ -75,6 +81,86 @@ GENERAL_KEYWORDS = [
     "vegan", "vegetarian"
 ]
 
+# --------------------------------------------------------
+# Multi-pattern matching (one pass per text)
+# --------------------------------------------------------
+class MultiPatternMatcher:
+    """
+    Finds every pattern occurring as a substring of a text, with the same
+    result as running `p in text` for each pattern, in a single regex scan.
+
+    The patterns are compiled into a trie-shaped regex tried as a zero-width
+    lookahead at every position; greedy matching reports the longest pattern
+    starting there. Every other pattern starting at that position is a
+    prefix of it, so those are added from a precomputed prefix table.
+    """
+
+    def __init__(self, patterns):
+        patterns = set(patterns)
+        trie = self._trie_regex(patterns)
+        self._regex = re.compile("(?=(" + trie + "))")
+        self._search_regex = re.compile(trie)
+        self._prefixes = {
+            p: frozenset(q for q in patterns if p.startswith(q))
+            for p in patterns
+        }
+
+    @classmethod
+    def _trie_regex(cls, patterns):
+        # Group by first character; a pattern that ends here makes the
+        # remainder optional (greedy, so longer patterns win)
+        by_first = {}
+        ends_here = False
+        for p in patterns:
+            if p:
+                by_first.setdefault(p[0], set()).add(p[1:])
+            else:
+                ends_here = True
+
+        branches = [re.escape(ch) + cls._trie_regex(rest)
+                    for ch, rest in sorted(by_first.items())]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if ends_here:
+            body = "(?:" + body + ")?"
+        return body
+
+    def search(self, text):
+        """True if any pattern occurs in `text`"""
+        return self._search_regex.search(text) is not None
+
+    def findall(self, text):
+        found = set()
+        for longest in set(self._regex.findall(text)):
+            found |= self._prefixes[longest]
+        return found
+
+
+_CUISINE_NAME_MATCHER = MultiPatternMatcher(CUISINE_KEYWORDS)
+
+_KEYWORD_MATCHER = MultiPatternMatcher(
+    [w for words in CUISINE_KEYWORDS.values() for w in words] + GENERAL_KEYWORDS
+)
+_CUISINES_BY_WORD = {}
+for _cuisine, _words in CUISINE_KEYWORDS.items():
+    for _w in _words:
+        _CUISINES_BY_WORD.setdefault(_w, set()).add(_cuisine)
+_GENERAL_KEYWORD_SET = frozenset(GENERAL_KEYWORDS)
+
+
+def detect_keywords(text):
+    """
+    Return (cuisines, general_keywords) found in `text` as sets.
+    A cuisine is hit when any of its keywords is a substring of `text`.
+    """
+    found = _KEYWORD_MATCHER.findall(text)
+    cuisines = set()
+    for w in found:
+        cuisines |= _CUISINES_BY_WORD.get(w, set())
+    return cuisines, found & _GENERAL_KEYWORD_SET
+
+
 # --------------------------------------------------------
 # NORMALIZATION: Expand cuisine terms (CRITICAL FIX)
 # --------------------------------------------------------
@@ -88,11 +174,11 @@ def normalize_food_list(food_list):
     for item in food_list:
         s = item.lower()
 
-        # Cuisine → expand keywords
-        for cuisine, words in CUISINE_KEYWORDS.items():
-            if cuisine in s:     # e.g., "korean food"
-                normalized.extend(words)
-                break
+        # Cuisine → expand keywords (one scan rejects plain dishes)
+        if _CUISINE_NAME_MATCHER.search(s):     # e.g., "korean food"
+            # first cuisine in dictionary order wins
+            cuisine = next(c for c in CUISINE_KEYWORDS if c in s)
+            normalized.extend(CUISINE_KEYWORDS[cuisine])
         else:
             # keep the dish as-is
             normalized.append(s)
@@ -104,17 +190,14 @@ def normalize_food_list(food_list):
 # Cuisine similarity (based on clusters)
 # --------------------------------------------------------
 def cuisine_similarity(foods1, foods2):
-    f1 = " ".join(foods1)
-    f2 = " ".join(foods2)
+    cuisines1, _ = detect_keywords(" ".join(foods1))
+    cuisines2, _ = detect_keywords(" ".join(foods2))
 
     score = 0
     matched_cuisines = []
 
-    for cuisine, words in CUISINE_KEYWORDS.items():
-        in1 = any(w in f1 for w in words)
-        in2 = any(w in f2 for w in words)
-
-        if in1 and in2:
+    for cuisine in CUISINE_KEYWORDS:
+        if cuisine in cuisines1 and cuisine in cuisines2:
             score += 30
             matched_cuisines.append(cuisine)
 
@@ -125,14 +208,14 @@ def cuisine_similarity(foods1, foods2):
 # General keyword overlap (weak signal)
 # --------------------------------------------------------
 def keyword_similarity(foods1, foods2):
-    f1 = " ".join(foods1)
-    f2 = " ".join(foods2)
+    _, kw1 = detect_keywords(" ".join(foods1))
+    _, kw2 = detect_keywords(" ".join(foods2))
 
     score = 0
     hits = []
 
     for kw in GENERAL_KEYWORDS:
-        if kw in f1 and kw in f2:
+        if kw in kw1 and kw in kw2:
             score += 5
             hits.append(kw)
 
@@ -159,11 +242,10 @@ def jaccard_similarity(list1, list2):
 # LLM-BASED SCORING
 # --------------------------------------------------------
 
+# User-specific lines go last so the instruction prefix can be reused
+# from the llama.cpp prompt cache
 SCORING_PROMPT = """You are a food compatibility expert. Analyze how well two people's food preferences match.
 
-Person A likes: {foods_a}
-Person B likes: {foods_b}
-
 Evaluate their compatibility based on:
 1. Shared specific dishes
 2. Similar cuisines (e.g., both like Asian food)
@@ -179,6 +261,9 @@ Example:
 Score: 85
 Shared: Italian cuisine, spicy food, pasta
 Reason: Both enjoy Italian food and spicy flavors with significant pasta overlap.
+
+Person A likes: {foods_a}
+Person B likes: {foods_b}
 """
 
 def score_pair_with_llm(user_a, user_b, llm):
@@ -192,6 +277,12 @@ def score_pair_with_llm(user_a, user_b, llm):
     if not foods_a or not foods_b:
         return score_pair(user_a, user_b)  # fallback
     
+    # Unchanged food lists → reuse the earlier answer (either order)
+    cache = get_pair_cache()
+    cached = cache.get("scoring", SCORING_PROMPT, foods_a, foods_b)
+    if cached is not None:
+        return cached
+    
     # Format foods as readable lists
     foods_a_str = ", ".join(foods_a)
     foods_b_str = ", ".join(foods_b)
@@ -227,13 +318,15 @@ def score_pair_with_llm(user_a, user_b, llm):
             
             reason = reason_match.group(1).strip() if reason_match else "LLM analysis"
             
-            return {
+            result = {
                 "score": score,
                 "shared_exact": shared_items[:3],  # top 3 shared items
                 "matched_cuisines": [],
                 "keyword_hits": [],
                 "llm_reason": reason
             }
+            cache.put("scoring", SCORING_PROMPT, foods_a, foods_b, result)
+            return result
         else:
             # Failed to parse, fallback
             print("⚠️ LLM response parsing failed, using rule-based scoring")
@@ -245,28 +338,343 @@ def score_pair_with_llm(user_a, user_b, llm):
 
 
 # --------------------------------------------------------
-# FINAL COMPATIBILITY SCORING (Rule-based fallback)
+# PRECOMPUTED FEATURES (computed once per food list)
 # --------------------------------------------------------
-def score_pair(user_a, user_b):
-    # Normalize (handle “Korean food”, “Mexican cuisine”, etc.)
-    foods1 = normalize_food_list(user_a.get("foodChoices", []))
-    foods2 = normalize_food_list(user_b.get("foodChoices", []))
+_CUISINE_NAMES = list(CUISINE_KEYWORDS)
+_CUISINE_BITS = {c: 1 << i for i, c in enumerate(_CUISINE_NAMES)}
+_KEYWORD_BITS = {kw: 1 << i for i, kw in enumerate(GENERAL_KEYWORDS)}
+
+# Normalized dish string <-> small integer id
+_DISH_IDS = {}
+_DISH_NAMES = []
+_DISH_LOCK = threading.Lock()
+
+
+def intern_dish(dish):
+    """Stable integer id for a normalized dish string"""
+    dish_id = _DISH_IDS.get(dish)
+    if dish_id is None:
+        with _DISH_LOCK:
+            dish_id = _DISH_IDS.get(dish)
+            if dish_id is None:
+                dish_id = _DISH_IDS[dish] = len(_DISH_NAMES)
+                _DISH_NAMES.append(dish)
+    return dish_id
+
+
+def dish_name(dish_id):
+    """Normalized dish string for an id from intern_dish"""
+    return _DISH_NAMES[dish_id]
+
+
+def mask_bits(mask):
+    """Indices of the set bits in `mask`, lowest first"""
+    return [i for i in range(mask.bit_length()) if mask >> i & 1]
+
+
+class UserFeatures:
+    """
+    Everything score_pair needs from one food list:
+      dish_ids       normalized dishes as interned integer ids
+      cuisine_mask   bit i set when cuisine i of CUISINE_KEYWORDS is hit
+      keyword_mask   bit i set when GENERAL_KEYWORDS[i] is hit
+    """
+    __slots__ = ("dish_ids", "cuisine_mask", "keyword_mask")
+
+    def __init__(self, food_choices):
+        foods = normalize_food_list(food_choices)
+        cuisines, keywords = detect_keywords(" ".join(foods))
+
+        self.dish_ids = frozenset(intern_dish(f) for f in foods)
+        self.cuisine_mask = sum(_CUISINE_BITS[c] for c in cuisines)
+        self.keyword_mask = sum(_KEYWORD_BITS[kw] for kw in keywords)
+
+
+@lru_cache(maxsize=FEATURE_CACHE_SIZE)
+def _features_for(food_choices):
+    return UserFeatures(food_choices)
 
-    # 1. Exact item overlap
-    jac_value, jac_matches = jaccard_similarity(foods1, foods2)
-    jac_score = int(jac_value * 40)  # up to 40 pts
+
+def clear_feature_cache():
+    """Forget every cached UserFeatures (the next lookups recompute them)"""
+    _features_for.cache_clear()
+
+
+def valid_profile(user):
+    """True for a profile the matchers can use: a name and a list of food strings"""
+    if not isinstance(user, dict) or not isinstance(user.get("name"), str):
+        return False
+    foods = user.get("foodChoices", [])
+    return isinstance(foods, list) and all(isinstance(f, str) for f in foods)
+
+
+def user_features(user):
+    """
+    Features for a user's current foodChoices. Cached by the food list
+    itself, so a profile is only re-processed after its foods change.
+    """
+    return _features_for(tuple(user.get("foodChoices", [])))
+
+
+def score_features(fa, fb):
+    """score_pair on precomputed features (set/bit operations only)"""
+    # 1. Exact item overlap (Jaccard)
+    shared = fa.dish_ids & fb.dish_ids
+    if fa.dish_ids and fb.dish_ids:
+        union = len(fa.dish_ids) + len(fb.dish_ids) - len(shared)
+        jac_score = int(len(shared) / union * 40)  # up to 40 pts
+    else:
+        shared = frozenset()
+        jac_score = 0
 
     # 2. Cuisine cluster match
-    cuisine_score, cuisines_matched = cuisine_similarity(foods1, foods2)
+    cuisines = mask_bits(fa.cuisine_mask & fb.cuisine_mask)
+    cuisine_score = min(30 * len(cuisines), 60)
 
     # 3. General keyword similarity
-    kw_score, kw_hits = keyword_similarity(foods1, foods2)
+    keywords = mask_bits(fa.keyword_mask & fb.keyword_mask)
+    kw_score = min(5 * len(keywords), 20)
 
     final_score = min(jac_score + cuisine_score + kw_score, 100)
 
     return {
         "score": final_score,
-        "shared_exact": jac_matches,
-        "matched_cuisines": cuisines_matched,
-        "keyword_hits": kw_hits
+        "shared_exact": [_DISH_NAMES[i] for i in shared],
+        "matched_cuisines": [_CUISINE_NAMES[i] for i in cuisines],
+        "keyword_hits": [GENERAL_KEYWORDS[i] for i in keywords]
     }
+
+
+# --------------------------------------------------------
+# FINAL COMPATIBILITY SCORING (Rule-based fallback)
+# --------------------------------------------------------
+def score_pair(user_a, user_b):
+    # Normalization (“Korean food”, “Mexican cuisine”, etc.) and keyword
+    # detection happen once per food list in user_features
+    return score_features(user_features(user_a), user_features(user_b))
+
+
+# --------------------------------------------------------
+# BATCH SCORING (one user against a whole population)
+# --------------------------------------------------------
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _popcount(masks):
+    """Per-element popcount of a uint64 array"""
+    return _POPCOUNT8[masks.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.int64)
+
+
+class FeatureMatrix:
+    """
+    A population's UserFeatures laid out as NumPy arrays, one row per user:
+      cuisine, keyword   uint64 bitmasks
+      starts, sizes      where each row's sorted dish ids start in `flat`,
+                         and how many there are
+      flat               every row's dish ids back to back (CSR layout,
+                         so one long food list doesn't widen every row)
+    Rows are added/updated/removed in place, so it can follow a UserStore.
+    An updated row's ids are appended to `flat`; the stale runs are
+    compacted away once they outnumber the live ones.
+    """
+
+    def __init__(self, users=()):
+        self.lock = threading.RLock()
+        self._slots = {}        # key -> row
+        self._free = []         # rows released by removed users
+        self._by_name = {}      # lowercase name -> {row}
+        self.users = []         # row -> profile (None when free)
+        self.keys = []          # row -> key (None when free)
+        self.active = np.zeros(0, dtype=bool)
+        self.cuisine = np.zeros(0, dtype=np.uint64)
+        self.keyword = np.zeros(0, dtype=np.uint64)
+        self.starts = np.zeros(0, dtype=np.int64)
+        self.sizes = np.zeros(0, dtype=np.int64)
+        self.flat = np.zeros(0, dtype=np.int32)
+        self._flat_len = 0      # used prefix of `flat`
+        self._stale = 0         # ids in `flat` no row points at any more
+
+        for i, user in enumerate(users):
+            self.update(i, user)
+
+    def attach(self, store):
+        """Load every profile in `store` and follow its future changes"""
+        store.subscribe(self.update)
+        return self
+
+    def __len__(self):
+        return len(self._slots)
+
+    def row_of(self, key):
+        """Row currently holding `key`, or None"""
+        return self._slots.get(key)
+
+    def get(self, key):
+        """Profile stored under `key`, or None"""
+        row = self._slots.get(key)
+        return None if row is None else self.users[row]
+
+    # ----------------------------------------
+    # Maintenance
+    # ----------------------------------------
+    def _grow(self, rows):
+        cap = len(self.active)
+        if rows > cap:
+            extra = max(rows, 2 * cap, 64) - cap
+            self.active = np.concatenate([self.active, np.zeros(extra, dtype=bool)])
+            self.cuisine = np.concatenate([self.cuisine, np.zeros(extra, dtype=np.uint64)])
+            self.keyword = np.concatenate([self.keyword, np.zeros(extra, dtype=np.uint64)])
+            self.starts = np.concatenate([self.starts, np.zeros(extra, dtype=np.int64)])
+            self.sizes = np.concatenate([self.sizes, np.zeros(extra, dtype=np.int64)])
+
+    def _compact(self):
+        """Rewrite `flat` with only the live rows' ids, in row order"""
+        sizes = np.where(self.active, self.sizes, 0)
+        starts = np.cumsum(sizes) - sizes
+        total = int(sizes.sum())
+        flat = np.zeros(max(total, 64), dtype=np.int32)
+        flat[:total] = self.flat[_run_indices(self.starts, sizes)]
+        self.flat, self.starts, self._flat_len, self._stale = flat, starts, total, 0
+
+    def _append_dishes(self, row, dish_ids):
+        if self._stale > max(self._flat_len - self._stale, 1024):
+            self._compact()
+        end = self._flat_len + len(dish_ids)
+        if end > len(self.flat):
+            self.flat = np.concatenate(
+                [self.flat, np.zeros(max(end, 2 * len(self.flat), 64) - len(self.flat),
+                                     dtype=np.int32)])
+        self.flat[self._flat_len:end] = sorted(dish_ids)
+        self.starts[row] = self._flat_len
+        self.sizes[row] = len(dish_ids)
+        self._flat_len = end
+
+    def _release(self, key):
+        row = self._slots.pop(key, None)
+        if row is None:
+            return
+        name = self.users[row]["name"].lower()
+        self._by_name[name].discard(row)
+        if not self._by_name[name]:
+            del self._by_name[name]
+        self.users[row] = None
+        self.keys[row] = None
+        self.active[row] = False
+        self._stale += int(self.sizes[row])
+        self.sizes[row] = 0
+        self._free.append(row)
+
+    def update(self, key, user):
+        """Add, refresh or (when `user` is None) remove one profile"""
+        with self.lock:
+            self._release(key)
+            if not valid_profile(user):
+                if user is not None:
+                    print(f"⚠️ Skipping malformed profile {key}: "
+                          f"needs a name and a list of food strings")
+                return
+
+            features = user_features(user)
+            if self._free:
+                row = self._free.pop()
+            else:
+                row = len(self.users)
+                self.users.append(None)
+                self.keys.append(None)
+            self._grow(len(self.users))
+
+            self._slots[key] = row
+            self._by_name.setdefault(user["name"].lower(), set()).add(row)
+            self.users[row] = user
+            self.keys[row] = key
+            self.active[row] = True
+            self.cuisine[row] = features.cuisine_mask
+            self.keyword[row] = features.keyword_mask
+            self._append_dishes(row, features.dish_ids)
+
+
+def _run_indices(starts, sizes):
+    """Positions of the runs flat[start:start + size], concatenated"""
+    bounds = np.cumsum(sizes) - sizes
+    return np.arange(int(sizes.sum())) + np.repeat(starts - bounds, sizes)
+
+
+def score_vector(user, matrix, rows=None):
+    """
+    score_pair of `user` against every row of `matrix` as an int64 array
+    (one entry per row, -1 for free rows and for the user themselves).
+    With `rows`, only those rows are scored and every other entry is -1.
+    Call with matrix.lock held if the rows must not change meanwhile.
+    """
+    fa = user_features(user)
+    n = len(matrix.users)
+    sel = slice(0, n) if rows is None else np.asarray(rows, dtype=np.int64)
+
+    # 1. Exact item overlap: mark the user's dishes, look up every dish
+    # id of the selected rows and sum the hits per row
+    sizes = matrix.sizes[sel]
+    jac_score = np.zeros(len(sizes), dtype=np.int64)
+    has = sizes > 0
+    if fa.dish_ids and has.any():
+        mark = np.zeros(len(_DISH_NAMES), dtype=bool)
+        mark[list(fa.dish_ids)] = True
+        starts = matrix.starts[sel][has]
+        if rows is None:
+            # Every row: running hit count over all of `flat`, one
+            # difference per row (stale runs are simply never read)
+            hits = np.cumsum(mark[matrix.flat[:matrix._flat_len]], dtype=np.int64)
+            hits = np.concatenate([np.zeros(1, dtype=np.int64), hits])
+            shared = hits[starts + sizes[has]] - hits[starts]
+        else:
+            hits = mark[matrix.flat[_run_indices(starts, sizes[has])]]
+            bounds = np.cumsum(sizes[has]) - sizes[has]
+            shared = np.add.reduceat(hits, bounds, dtype=np.int64)
+        union = len(fa.dish_ids) + sizes[has] - shared
+        jac_score[has] = (shared / union * 40).astype(np.int64)
+
+    # 2. Cuisine cluster match
+    cuisine_score = np.minimum(
+        30 * _popcount(matrix.cuisine[sel] & np.uint64(fa.cuisine_mask)), 60)
+
+    # 3. General keyword similarity
+    kw_score = np.minimum(
+        5 * _popcount(matrix.keyword[sel] & np.uint64(fa.keyword_mask)), 20)
+
+    scores = np.minimum(jac_score + cuisine_score + kw_score, 100)
+    scores[~matrix.active[sel]] = -1
+    if rows is not None:
+        scores, subset = np.full(n, -1, dtype=np.int64), scores
+        scores[sel] = subset
+    for row in matrix._by_name.get(user["name"].lower(), ()):
+        scores[row] = -1
+    return scores
+
+
+def top_rows(scores, k):
+    """Indices of the `k` highest non-negative scores, best first (ties by row)"""
+    k = min(k, int((scores >= 0).sum()))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < len(scores):
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.lexsort((top, -scores[top]))][:k]
+
+
+def score_many(user, others, k):
+    """
+    Score `user` against every profile in `others` (a FeatureMatrix or a
+    list of profiles) and return the top `k` as [(other, score_pair dict)],
+    best first. The user themselves is skipped. Scores are identical to
+    score_pair; only the k winners get the full result dict built.
+    """
+    matrix = others if isinstance(others, FeatureMatrix) else FeatureMatrix(others)
+    fa = user_features(user)
+
+    with matrix.lock:
+        if not matrix.users or k <= 0:
+            return []
+        winners = [matrix.users[row] for row in top_rows(score_vector(user, matrix), k)]
+
+    return [(other, score_features(fa, user_features(other))) for other in winners]
@@ -0,0 +1,202 @@
+# match_jobs.py
+"""
+Background match jobs for Food-Friend
+A POST enqueues a job and returns immediately; clients poll its status,
+partial (Python-only) results and final (hybrid) results. Job state is
+mirrored to SQLite so any server process can answer the polls.
+"""
+
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from config import MATCH_JOB_WORKERS, MATCH_JOB_TTL, MATCH_JOB_DB_PATH
+
+
+class MatchJob:
+    """State of one match job, safe to read while the worker updates it"""
+
+    def __init__(self, key, on_change=None):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = "queued"      # queued → running → done | failed
+        self._partial = None        # Python-pass matches, once available
+        self.result = None          # final matches
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self._on_change = on_change
+
+    @property
+    def active(self):
+        return self.status in ("queued", "running")
+
+    @property
+    def partial(self):
+        return self._partial
+
+    @partial.setter
+    def partial(self, matches):
+        self._partial = matches
+        if self._on_change is not None:
+            self._on_change(self)
+
+    def to_dict(self):
+        data = {
+            "jobId": self.id,
+            "status": self.status,
+            "partialMatches": self.partial,
+        }
+        if self.status == "done":
+            data["matches"] = self.result
+        if self.status == "failed":
+            data["error"] = self.error
+        return data
+
+
+class MatchJobManager:
+    """
+    Runs match jobs on a small worker pool.
+    Jobs are de-duplicated by key (user + profile version): submitting the
+    same key while a job for it is queued or running in this process
+    returns that job. Finished jobs stay pollable for MATCH_JOB_TTL
+    seconds, from this process directly and from others via `path`.
+    """
+
+    def __init__(self, workers=MATCH_JOB_WORKERS, ttl=MATCH_JOB_TTL, path=MATCH_JOB_DB_PATH):
+        self.ttl = ttl
+        self._jobs = {}         # id -> MatchJob
+        self._active = {}       # key -> MatchJob (queued or running)
+        self._futures = {}      # id -> Future of a queued or running job
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix="match-job")
+
+        self._db = None
+        self._db_lock = threading.Lock()
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(path), check_same_thread=False, timeout=10)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS match_jobs (
+                       id TEXT PRIMARY KEY,
+                       state TEXT NOT NULL,
+                       finished REAL
+                   )"""
+            )
+            self._db.commit()
+
+    def _save(self, job):
+        """Mirror the job's pollable state for other processes"""
+        if self._db is None:
+            return
+        state = json.dumps(job.to_dict())
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO match_jobs (id, state, finished) VALUES (?, ?, ?)",
+                (job.id, state, job.finished),
+            )
+            self._db.commit()
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        for job_id, job in list(self._jobs.items()):
+            if job.finished is not None and job.finished < cutoff:
+                del self._jobs[job_id]
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM match_jobs WHERE finished < ?", (cutoff,))
+                self._db.commit()
+
+    def submit(self, key, run):
+        """
+        Enqueue `run(job)` for `key` (or return the job already running for
+        it). `run` may set job.partial while working and returns the final
+        result. Returns (job, created).
+        """
+        with self._lock:
+            self._expire()
+            job = self._active.get(key)
+            if job is not None and job.active:
+                return job, False
+
+            job = MatchJob(key, on_change=self._save)
+            self._jobs[job.id] = job
+            self._active[key] = job
+            self._save(job)
+            self._futures[job.id] = self._executor.submit(self._run, job, run)
+
+        return job, True
+
+    def _run(self, job, run):
+        job.status = "running"
+        self._save(job)
+        try:
+            job.result = run(job)
+            job.status = "done"
+        except Exception as e:
+            print(f"❌ Match job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            self._finish(job)
+
+    def _finish(self, job):
+        job.finished = time.time()
+        self._save(job)
+        with self._lock:
+            self._futures.pop(job.id, None)
+            if self._active.get(job.key) is job:
+                del self._active[job.key]
+
+    def get(self, job_id):
+        """
+        The job with this ID, or None. Jobs of other processes come back as
+        read-only snapshots of their last saved state.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None or self._db is None:
+            return job
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT state FROM match_jobs WHERE id = ?", (job_id,)).fetchone()
+        return None if row is None else _SavedJob(json.loads(row[0]))
+
+    def shutdown(self, timeout=None):
+        """
+        Stop taking jobs: queued ones fail as cancelled and running ones get
+        up to `timeout` seconds to finish. Returns True when all finished.
+        """
+        with self._lock:
+            futures = dict(self._futures)
+            jobs = {job_id: self._jobs[job_id] for job_id in futures}
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+        running = []
+        for job_id, future in futures.items():
+            if future.cancelled():
+                job = jobs[job_id]
+                job.error = "Server shutting down"
+                job.status = "failed"
+                self._finish(job)
+            else:
+                running.append(future)
+        _, pending = wait(running, timeout)
+        return not pending
+
+
+class _SavedJob:
+    """Another process's job as last saved (enough for to_dict())"""
+
+    def __init__(self, state):
+        self.state = state
+        self.id = state["jobId"]
+        self.status = state["status"]
+
+    def to_dict(self):
+        return dict(self.state)
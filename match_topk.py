@@ -0,0 +1,354 @@
+# match_topk.py
+"""
+Persisted top-k match table for Food-Friend
+Every user's best Python-pass candidates (and their last hybrid matches) are
+kept in a table that is patched incrementally when a profile changes,
+instead of re-scoring everyone on each match request
+"""
+
+import json
+import sqlite3
+import hashlib
+import threading
+
+import numpy as np
+
+from config import TOPK_SIZE, TOPK_PATH, TOPK_REPLAY_MAX_FRACTION
+from match_engine import score_vector, top_rows, user_features, score_features, valid_profile
+from match_cache import ranking_version
+
+# _kth value for rows that must not receive inserts (no row for that user)
+_NO_ROW = 1 << 30
+
+
+def profile_version(user):
+    """Fingerprint of the profile fields that affect matching"""
+    raw = json.dumps([user["name"].lower(), user.get("foodChoices", [])], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class TopKTable:
+    """
+    key -> the user's `k` best candidates as [[other key, score]] (best
+    first), plus the hybrid matches last computed from exactly those
+    candidates.
+
+    When a profile changes only the affected rows are touched:
+      - the changed user's own row is recomputed,
+      - rows that listed the user are patched in place while its new score
+        still beats their k-th entry, and dropped (recomputed lazily) when
+        it falls below,
+      - rows whose k-th entry the user now beats get it inserted.
+    A touched row loses its stored matches. Rows live in a FeatureMatrix's
+    row space and are persisted to SQLite together with `ranking` (the
+    ranking_version they were computed under); a table saved under
+    another ranking is discarded. Stored matches carry the scoring
+    version they were computed under and only count for that version.
+
+    With an `index` (a TasteIndex), rows and updates only score the
+    index's nearest profiles instead of the whole population, so both
+    are approximate: a changed user is only inserted into the rows of
+    profiles the index finds near it.
+    """
+
+    def __init__(self, population, k=TOPK_SIZE, path=TOPK_PATH, index=None, ranking=None):
+        self.population = population
+        self.k = k
+        self.index = index
+        self.ranking = ranking or ranking_version()
+        self._lock = threading.RLock()
+        self._rows = {}         # key -> {"entries": [[key, score]],
+                                #         "matches": [scoring version, list] | None}
+        self._owners = {}       # key -> {row keys listing it}
+        self._versions = {}     # key -> profile_version of the current profile
+        self._kth = np.zeros(0, dtype=np.int64)  # matrix row -> k-th score (-1 if short)
+        self._loading = False
+        self.updates = 0
+        self.hits = 0
+        self.misses = 0
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS topk (
+                   key TEXT PRIMARY KEY,
+                   k INTEGER NOT NULL,
+                   entries TEXT NOT NULL,
+                   matches TEXT
+               )"""
+        )
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS profiles (
+                   key TEXT PRIMARY KEY,
+                   version TEXT NOT NULL
+               )"""
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._db.commit()
+
+    def attach(self, store):
+        """
+        Follow `store`. Attach the FeatureMatrix (and the index) first:
+        the table scores against them. Persisted rows are reused; profiles that changed while
+        the server was down are applied as ordinary updates, unless they
+        exceed TOPK_REPLAY_MAX_FRACTION of the rows: then every row is
+        dropped and rebuilt on demand.
+        """
+        with self._lock:
+            self._loading = True
+            store.subscribe(self.update)
+            self._loading = False
+            self._load()
+        return self
+
+    # ----------------------------------------
+    # Persistence
+    # ----------------------------------------
+    def _load(self):
+        saved = dict(self._db.execute("SELECT key, version FROM profiles"))
+        changed = [key for key, version in self._versions.items() if saved.get(key) != version]
+        removed = [key for key in saved if key not in self._versions]
+
+        # Rows saved under other ranking settings (or before they were
+        # recorded) are discarded: their candidates may rank differently now
+        ranking = self._db.execute("SELECT value FROM meta WHERE key = 'ranking'").fetchone()
+        stale = 0
+        for key, k, entries, matches in self._db.execute(
+                "SELECT key, k, entries, matches FROM topk"):
+            if ranking is None or ranking[0] != self.ranking:
+                stale += 1
+            elif k == self.k and key in self._versions and saved.get(key) == self._versions[key]:
+                self._set_row(key, json.loads(entries),
+                              json.loads(matches) if matches else None)
+        self._db.execute("DELETE FROM topk")
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('ranking', ?)",
+                         (self.ranking,))
+
+        dropped = 0
+        if self._rows and len(changed) > TOPK_REPLAY_MAX_FRACTION * len(self._rows):
+            dropped = len(self._rows)
+            self._clear_rows()
+        for key in removed:
+            self._remove(key)
+        if self._rows:
+            for key in changed:
+                self._apply(key, self.population.get(key))
+
+        self._db.execute("DELETE FROM profiles")
+        self._db.executemany("INSERT INTO profiles (key, version) VALUES (?, ?)",
+                             self._versions.items())
+        self._persist(self._rows)
+        print(f"📋 Top-{self.k} table: {len(self._rows)} stored rows, "
+              f"{len(changed)} profiles changed and {len(removed)} removed since last run"
+              + (f"; {dropped} rows dropped, rebuilt on demand" if dropped else "")
+              + (f"; {stale} rows discarded (ranking settings changed)" if stale else ""))
+
+    def _persist(self, keys):
+        """Write the given rows (deleting the ones that no longer exist)"""
+        for key in keys:
+            row = self._rows.get(key)
+            if row is None:
+                self._db.execute("DELETE FROM topk WHERE key = ?", (key,))
+            else:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO topk (key, k, entries, matches) VALUES (?, ?, ?, ?)",
+                    (key, self.k, json.dumps(row["entries"]),
+                     None if row["matches"] is None else json.dumps(row["matches"])),
+                )
+        self._db.commit()
+
+    # ----------------------------------------
+    # Row bookkeeping
+    # ----------------------------------------
+    def _threshold(self, entries):
+        return entries[-1][1] if len(entries) >= self.k else -1
+
+    def _grow_kth(self, rows):
+        if rows > len(self._kth):
+            grown = np.full(max(rows, 2 * len(self._kth), 64), _NO_ROW, dtype=np.int64)
+            grown[:len(self._kth)] = self._kth
+            self._kth = grown
+
+    def _set_kth(self, key, value):
+        row = self.population.row_of(key)
+        if row is not None:
+            self._grow_kth(row + 1)
+            self._kth[row] = value
+
+    def _set_row(self, key, entries, matches=None):
+        self._drop_row(key)
+        self._rows[key] = {"entries": entries, "matches": matches}
+        for other, _ in entries:
+            self._owners.setdefault(other, set()).add(key)
+        self._set_kth(key, self._threshold(entries))
+
+    def _clear_rows(self):
+        """Drop every row (each is recomputed on its next request)"""
+        self._rows.clear()
+        self._owners.clear()
+        self._kth[:] = _NO_ROW
+
+    def _drop_row(self, key):
+        row = self._rows.pop(key, None)
+        if row is None:
+            return
+        for other, _ in row["entries"]:
+            owners = self._owners.get(other)
+            if owners is not None:
+                owners.discard(key)
+                if not owners:
+                    del self._owners[other]
+        self._set_kth(key, _NO_ROW)
+
+    def _scores(self, user):
+        """
+        score_vector against the index's nearest profiles (-1 elsewhere),
+        or against everyone without a clustered index. Call with the
+        population lock held.
+        """
+        keys = self.index.search(user) if self.index is not None else None
+        if keys is None:
+            return score_vector(user, self.population)
+        rows = [r for r in map(self.population.row_of, keys) if r is not None]
+        return score_vector(user, self.population, rows)
+
+    def _compute(self, key, scores):
+        """Full top-k row from a score_vector"""
+        keys = self.population.keys
+        return [[keys[r], int(scores[r])] for r in top_rows(scores, self.k)]
+
+    # ----------------------------------------
+    # Delta updates
+    # ----------------------------------------
+    def update(self, key, user):
+        """UserStore listener: apply one added, changed or removed profile"""
+        with self._lock:
+            if not valid_profile(user):
+                self._versions.pop(key, None)
+                touched = self._remove(key)
+                if not self._loading:
+                    self._db.execute("DELETE FROM profiles WHERE key = ?", (key,))
+                    self._persist(touched)
+                return
+
+            version = profile_version(user)
+            if self._versions.get(key) == version:
+                return
+            self._versions[key] = version
+            if self._loading:
+                return
+
+            touched = self._apply(key, user)
+            self._db.execute("INSERT OR REPLACE INTO profiles (key, version) VALUES (?, ?)",
+                             (key, version))
+            self._persist(touched)
+
+    def _remove(self, key):
+        """Forget `key`; rows that listed it are dropped. Returns touched keys."""
+        touched = {key} | self._owners.get(key, set())
+        for owner in list(touched):
+            self._drop_row(owner)
+        return touched
+
+    def _apply(self, key, user):
+        """Patch the table for a new or changed profile. Returns touched keys."""
+        self.updates += 1
+        touched = {key}
+        pop = self.population
+        with pop.lock:
+            scores = self._scores(user)
+            n = len(scores)
+            self._grow_kth(n)
+
+            # Rows that already list the user: rescore it in place
+            for owner in list(self._owners.get(key, ())):
+                touched.add(owner)
+                r = pop.row_of(owner)
+                entries = self._rows[owner]["entries"]
+                score = int(scores[r]) if r is not None else -1
+                if score < 0 or score < self._threshold(entries):
+                    # Someone outside the row may now rank higher
+                    self._drop_row(owner)
+                    continue
+                entries = [e for e in entries if e[0] != key] + [[key, score]]
+                entries.sort(key=lambda e: -e[1])
+                self._set_row(owner, entries)
+
+            # Rows whose k-th entry the user now beats
+            listed = self._owners.get(key, set())
+            for r in np.nonzero(scores > self._kth[:n])[0]:
+                owner = pop.keys[r]
+                if owner not in self._rows:
+                    self._kth[r] = _NO_ROW  # matrix row reused since its owner left
+                    continue
+                if owner == key or owner in listed:
+                    continue
+                touched.add(owner)
+                entries = self._rows[owner]["entries"] + [[key, int(scores[r])]]
+                entries.sort(key=lambda e: -e[1])
+                self._set_row(owner, entries[:self.k])
+
+            self._set_row(key, self._compute(key, scores))
+        return touched
+
+    # ----------------------------------------
+    # Lookups
+    # ----------------------------------------
+    def _row_for(self, key, user):
+        """The user's current row, recomputing it when missing or stale"""
+        if self._versions.get(key) != profile_version(user):
+            self.update(key, user)
+        row = self._rows.get(key)
+        if row is None:
+            with self.population.lock:
+                self._set_row(key, self._compute(key, self._scores(user)))
+            self._persist([key])
+            row = self._rows[key]
+        return row
+
+    def candidates(self, key, user):
+        """Top-k candidates as [(other, score_pair dict)], best first"""
+        with self._lock:
+            entries = self._row_for(key, user)["entries"]
+            others = [self.population.get(other) for other, _ in entries]
+        fa = user_features(user)
+        return [(other, score_features(fa, user_features(other)))
+                for other in others if other is not None]
+
+    def matches(self, key, user, scoring):
+        """Hybrid matches stored for the user's current row under `scoring`, or None"""
+        with self._lock:
+            stored = self._row_for(key, user)["matches"]
+            if stored is None or stored[0] != scoring:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return stored[1]
+
+    def store_matches(self, key, user, candidates, matches, scoring):
+        """
+        Remember the hybrid matches computed from `candidates` (as returned
+        by candidates()) under scoring version `scoring`; ignored if the
+        row changed in the meantime
+        """
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None or self._versions.get(key) != profile_version(user):
+                return
+            current = [self.population.get(other) for other, _ in row["entries"]]
+            if len(current) != len(candidates) or any(
+                    a is not b for a, (b, _) in zip(current, candidates)):
+                return
+            row["matches"] = [scoring, matches]
+            self._persist([key])
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rows": len(self._rows),
+                "updates": self.updates,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
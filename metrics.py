@@ -0,0 +1,188 @@
+# metrics.py
+"""
+Latency and token metrics for Food-Friend
+Histograms and gauges rendered in the Prometheus text format, plus the
+per-request stage timings that api_server sends as a Server-Timing header
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+
+# Bucket upper bounds (the +Inf bucket is implicit)
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (8, 16, 32, 64, 128, 256, 512, 1024, 2048)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels"""
+
+    def __init__(self, name, help, labels=(), buckets=SECONDS_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for values, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    labels = _labels(self.label_names + ("le",), values + (bound,))
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _labels(self.label_names + ("le",), values + ("+Inf",))
+                lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+                labels = _labels(self.label_names, values)
+                lines.append(f"{self.name}_sum{labels} {series[-2]:.6f}")
+                lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+class Gauge:
+    """Value read from a callback at scrape time"""
+
+    def __init__(self, name, help, read):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge",
+                f"{self.name} {self.read()}"]
+
+
+_metrics = []
+
+
+def histogram(name, help, labels=(), buckets=SECONDS_BUCKETS):
+    metric = Histogram(name, help, labels, buckets)
+    _metrics.append(metric)
+    return metric
+
+
+def gauge(name, help, read):
+    metric = Gauge(name, help, read)
+    _metrics.append(metric)
+    return metric
+
+
+def render():
+    """Every registered metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --------------------------------------------------------
+# Stage timings
+# --------------------------------------------------------
+STAGE_SECONDS = histogram(
+    "foodfriend_stage_seconds", "Time spent per request stage", labels=("stage",))
+HTTP_SECONDS = histogram(
+    "foodfriend_http_request_seconds", "Request handling time",
+    labels=("endpoint", "status"))
+
+_request = threading.local()
+
+
+def begin_request():
+    """Start collecting stage timings for the current thread's request"""
+    _request.stages = []
+
+
+def request_stages():
+    """[(stage, seconds)] recorded since begin_request() on this thread"""
+    return getattr(_request, "stages", [])
+
+
+def record_stage(name, seconds):
+    STAGE_SECONDS.observe(seconds, name)
+    stages = getattr(_request, "stages", None)
+    if stages is not None:
+        stages.append((name, seconds))
+
+
+@contextmanager
+def stage(name):
+    """Time a block as one request stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def server_timing(stages, total=None):
+    """Server-Timing header value; repeated stages are summed"""
+    totals = {}
+    for name, seconds in stages:
+        totals[name] = totals.get(name, 0.0) + seconds
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items()]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+# --------------------------------------------------------
+# LLM calls
+# --------------------------------------------------------
+LLM_SECONDS = histogram(
+    "foodfriend_llm_call_seconds", "Wall time of one LLM call", labels=("kind",))
+LLM_PROMPT_SECONDS = histogram(
+    "foodfriend_llm_prompt_eval_seconds",
+    "Time to the first generated token (prompt evaluation), streamed calls only",
+    labels=("kind",))
+LLM_PROMPT_TOKENS = histogram(
+    "foodfriend_llm_prompt_tokens", "Prompt tokens per LLM call",
+    labels=("kind",), buckets=TOKEN_BUCKETS)
+LLM_COMPLETION_TOKENS = histogram(
+    "foodfriend_llm_completion_tokens", "Generated tokens per LLM call",
+    labels=("kind",), buckets=TOKEN_BUCKETS)
+LLM_TOKENS_PER_SECOND = histogram(
+    "foodfriend_llm_tokens_per_second", "Generation speed per LLM call",
+    labels=("kind",), buckets=RATE_BUCKETS)
+
+
+def record_llm(kind, seconds, prompt_tokens=None, completion_tokens=None,
+               first_token_seconds=None):
+    """
+    Record one LLM call. Generation speed uses the time after the first
+    token when it is known, otherwise the whole call.
+    """
+    record_stage(f"llm_{kind}", seconds)
+    LLM_SECONDS.observe(seconds, kind)
+    if first_token_seconds is not None:
+        LLM_PROMPT_SECONDS.observe(first_token_seconds, kind)
+    if prompt_tokens is not None:
+        LLM_PROMPT_TOKENS.observe(prompt_tokens, kind)
+    if completion_tokens:
+        LLM_COMPLETION_TOKENS.observe(completion_tokens, kind)
+        generating = seconds - (first_token_seconds or 0.0)
+        if generating > 0:
+            LLM_TOKENS_PER_SECOND.observe(completion_tokens / generating, kind)
@@ -0,0 +1,46 @@
+# migrate_users.py
+"""
+Import the user_*.json profiles into the SQLite user store
+
+    python migrate_users.py                      # data/users -> data/users.sqlite3
+    python migrate_users.py --source backup/users --db /tmp/users.sqlite3
+
+Existing rows for the same user are replaced; run it again after editing
+JSON files to re-import them. Set USER_STORE_BACKEND = "sqlite" in
+config.py afterwards to serve from the database.
+"""
+
+import argparse
+from pathlib import Path
+
+from config import USER_DATA_DIR, USER_DB_PATH
+from user_store import JSONUserStore, SQLiteUserStore
+
+
+def migrate(source=USER_DATA_DIR, db=USER_DB_PATH, batch_size=1000):
+    """Copy every valid profile from `source` into `db`; returns (imported, skipped)"""
+    json_store = JSONUserStore(source)
+    json_store.refresh(force=True)
+    users = json_store.all_users()
+    skipped = len(json_store) - len(users)
+
+    sqlite_store = SQLiteUserStore(Path(db))
+    for start in range(0, len(users), batch_size):
+        sqlite_store.save_many(users[start:start + batch_size])
+    return len(users), skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import user_*.json profiles into SQLite")
+    parser.add_argument("--source", default=USER_DATA_DIR, help="directory of user_*.json files")
+    parser.add_argument("--db", default=str(USER_DB_PATH), help="SQLite database to write")
+    args = parser.parse_args()
+
+    imported, skipped = migrate(args.source, args.db)
+    print(f"✅ Imported {imported} profiles from {args.source} into {args.db}")
+    if skipped:
+        print(f"⚠️  Skipped {skipped} unreadable or nameless files")
+
+
+if __name__ == "__main__":
+    main()
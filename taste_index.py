@@ -0,0 +1,456 @@
+# taste_index.py
+"""
+Approximate nearest-neighbour index over user taste vectors
+An IVF (inverted file) index in plain NumPy: vectors are clustered with
+k-means, and a query only scans the profiles in its closest clusters.
+The hits are candidates; callers rescore them exactly with score_pair.
+"""
+
+import os
+import json
+import zlib
+import atexit
+import tempfile
+import threading
+
+import numpy as np
+
+from config import (
+    ANN_MIN_TRAIN, ANN_CANDIDATES, ANN_NPROBE, ANN_EMBEDDING_WEIGHT, ANN_INDEX_PATH,
+)
+from match_engine import (
+    CUISINE_KEYWORDS, GENERAL_KEYWORDS, mask_bits, dish_name, user_features,
+    valid_profile,
+)
+from match_topk import profile_version
+from embeddings import normalize_item
+
+# Normalized dishes are hashed into this many one-hot slots
+DISH_BUCKETS = 64
+
+# Rows sampled for k-means and iterations run
+_TRAIN_SAMPLE_PER_LIST = 40
+_TRAIN_ITERATIONS = 10
+
+# Rows assigned to clusters per matrix product (bounds temporary memory)
+_CHUNK = 8192
+
+
+# --------------------------------------------------------
+# Taste vectors
+# --------------------------------------------------------
+class TasteVectorizer:
+    """
+    Maps a food list to a vector whose inner products approximate
+    score_pair: cuisine and keyword one-hots scaled so a shared hit adds
+    its score_pair points (shrunk past the 2 cuisines / 4 keywords where
+    score_pair caps them), hashed dish one-hots (worth up to 40 like the
+    Jaccard term) and the user's mean item embedding (zeros until the
+    items are embedded).
+    """
+
+    def __init__(self, embedder=None, embedding_weight=ANN_EMBEDDING_WEIGHT):
+        self.embedder = embedder
+        self.embedding_dim = embedder.dim if embedder is not None else 0
+        self.embedding_weight = embedding_weight
+        self._cuisine_dims = len(CUISINE_KEYWORDS)
+        self._keyword_dims = len(GENERAL_KEYWORDS)
+        self.dim = self._cuisine_dims + self._keyword_dims + DISH_BUCKETS + self.embedding_dim
+
+    def signature(self):
+        """Everything a saved vector depends on besides the profile"""
+        return {
+            "cuisines": list(CUISINE_KEYWORDS),
+            "keywords": GENERAL_KEYWORDS,
+            "dishBuckets": DISH_BUCKETS,
+            "embeddingDim": self.embedding_dim,
+            "embeddingModel": self.embedder.cache.model if self.embedding_dim else None,
+            "embeddingWeight": self.embedding_weight,
+        }
+
+    def embedded(self, food_choices):
+        """True unless some item still lacks a cached embedding"""
+        if not self.embedding_dim:
+            return True
+        items = [normalize_item(i) for i in food_choices if i.strip()]
+        return len(self.embedder.cache.get_many(items)) == len(set(items))
+
+    def __call__(self, food_choices):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        features = user_features({"foodChoices": food_choices})
+
+        cuisines = mask_bits(features.cuisine_mask)
+        vector[cuisines] = np.sqrt(30 / max(1, len(cuisines) / 2))
+        offset = self._cuisine_dims
+        keywords = mask_bits(features.keyword_mask)
+        vector[[offset + i for i in keywords]] = np.sqrt(5 / max(1, len(keywords) / 4))
+
+        offset += self._keyword_dims
+        if features.dish_ids:
+            weight = np.sqrt(40 / len(features.dish_ids))
+            for dish_id in features.dish_ids:
+                bucket = zlib.crc32(dish_name(dish_id).encode("utf-8")) % DISH_BUCKETS
+                vector[offset + bucket] += weight
+
+        if self.embedding_dim:
+            # Cached item vectors only: the index never waits for the model
+            taste = self.embedder.user_vector(food_choices)
+            if taste is not None and len(taste) == self.embedding_dim:
+                vector[-self.embedding_dim:] = np.sqrt(self.embedding_weight) * taste
+        return vector
+
+
+def _unit(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+# --------------------------------------------------------
+# IVF index
+# --------------------------------------------------------
+class IVFIndex:
+    """
+    key -> vector, searched by inner product. Until `min_train` vectors
+    exist every query scans them all; after that the vectors are
+    clustered into ~sqrt(n) lists (spherical k-means) and a query scans
+    the `nprobe` lists whose centroids are closest. Inserts go to the
+    nearest existing list; the clustering is retrained once the index has
+    doubled since the last training.
+    """
+
+    def __init__(self, dim, nprobe=ANN_NPROBE, min_train=ANN_MIN_TRAIN, seed=0):
+        self.dim = dim
+        self.nprobe = nprobe
+        self.min_train = min_train
+        self.seed = seed
+        self.lock = threading.RLock()
+        self._slots = {}        # key -> row
+        self._free = []         # rows released by removed keys
+        self.keys = []          # row -> key (None when free)
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.assign = np.zeros(0, dtype=np.int64)  # row -> list (-1 when free)
+        self.centroids = None   # (lists, dim) unit vectors once trained
+        self._lists = []        # list -> {row}
+        self._arrays = []       # list -> sorted row array (None when stale)
+        self.trained_size = 0
+
+    def __len__(self):
+        return len(self._slots)
+
+    def get(self, key):
+        row = self._slots.get(key)
+        return None if row is None else self.vectors[row]
+
+    # ----------------------------------------
+    # Maintenance
+    # ----------------------------------------
+    def _grow(self, rows):
+        cap = len(self.vectors)
+        if rows > cap:
+            extra = max(rows, 2 * cap, 64) - cap
+            self.vectors = np.concatenate(
+                [self.vectors, np.zeros((extra, self.dim), dtype=np.float32)])
+            self.assign = np.concatenate([self.assign, np.full(extra, -1, dtype=np.int64)])
+
+    def _unlist(self, row):
+        lst = self.assign[row]
+        if lst >= 0:
+            self._lists[lst].discard(row)
+            self._arrays[lst] = None
+        self.assign[row] = -1
+
+    def _list(self, rows, lists):
+        self.assign[rows] = lists
+        for row, lst in zip(rows, lists):
+            self._lists[lst].add(row)
+            self._arrays[lst] = None
+
+    def _nearest(self, vectors):
+        """Closest centroid per vector (cosine), computed in chunks"""
+        out = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), _CHUNK):
+            chunk = _unit(vectors[start:start + _CHUNK])
+            out[start:start + _CHUNK] = np.argmax(chunk @ self.centroids.T, axis=1)
+        return out
+
+    def add(self, key, vector):
+        """Insert or replace the vector stored under `key`"""
+        with self.lock:
+            row = self._slots.get(key)
+            if row is None:
+                if self._free:
+                    row = self._free.pop()
+                else:
+                    row = len(self.keys)
+                    self.keys.append(None)
+                    self._grow(len(self.keys))
+                self._slots[key] = row
+                self.keys[row] = key
+            else:
+                self._unlist(row)
+            self.vectors[row] = vector
+            if self.centroids is not None:
+                self._list([row], self._nearest(self.vectors[row:row + 1]))
+            if len(self) >= max(self.min_train, 2 * self.trained_size):
+                self.train()
+
+    def remove(self, key):
+        with self.lock:
+            row = self._slots.pop(key, None)
+            if row is None:
+                return
+            self._unlist(row)
+            self.keys[row] = None
+            self.vectors[row] = 0
+            self._free.append(row)
+
+    def train(self, centroids=None):
+        """(Re)cluster every vector, or adopt given centroids, and reassign"""
+        with self.lock:
+            rows = np.array(sorted(self._slots.values()), dtype=np.int64)
+            if len(rows) == 0:
+                return
+            if centroids is None:
+                centroids = self._kmeans(rows, max(1, int(np.sqrt(len(rows)))))
+            self.centroids = np.asarray(centroids, dtype=np.float32)
+            self._lists = [set() for _ in range(len(self.centroids))]
+            self._arrays = [None] * len(self.centroids)
+            self.assign[:] = -1
+            self._list(rows, self._nearest(self.vectors[rows]))
+            self.trained_size = len(rows)
+
+    def _kmeans(self, rows, lists):
+        rng = np.random.default_rng(self.seed)
+        sample = rows
+        if len(rows) > lists * _TRAIN_SAMPLE_PER_LIST:
+            sample = rng.choice(rows, lists * _TRAIN_SAMPLE_PER_LIST, replace=False)
+        points = _unit(self.vectors[sample])
+        centroids = points[rng.choice(len(points), lists, replace=False)]
+        for _ in range(_TRAIN_ITERATIONS):
+            nearest = np.argmax(points @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, nearest, points)
+            counts = np.bincount(nearest, minlength=lists)
+            empty = counts == 0
+            # Empty clusters restart at random points
+            sums[empty] = points[rng.choice(len(points), int(empty.sum()))]
+            centroids = _unit(sums)
+        return centroids
+
+    # ----------------------------------------
+    # Queries
+    # ----------------------------------------
+    def _rows_of(self, lst):
+        rows = self._arrays[lst]
+        if rows is None:
+            rows = self._arrays[lst] = np.array(sorted(self._lists[lst]), dtype=np.int64)
+        return rows
+
+    def search(self, query, count, nprobe=None):
+        """Keys of the `count` largest inner products with `query`, best first"""
+        query = np.asarray(query, dtype=np.float32)
+        with self.lock:
+            if not self._slots:
+                return []
+            if self.centroids is None:
+                rows = np.array(sorted(self._slots.values()), dtype=np.int64)
+            else:
+                nprobe = min(nprobe or self.nprobe, len(self.centroids))
+                closest = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+                rows = np.concatenate([self._rows_of(lst) for lst in closest])
+            scores = self.vectors[rows] @ query
+            if count < len(rows):
+                top = np.argpartition(-scores, count - 1)[:count]
+            else:
+                top = np.arange(len(rows))
+            top = top[np.argsort(-scores[top], kind="stable")]
+            return [self.keys[r] for r in rows[top]]
+
+
+# --------------------------------------------------------
+# Index following a UserStore
+# --------------------------------------------------------
+class TasteIndex:
+    """
+    One taste vector per profile in an IVFIndex, kept in sync through
+    UserStore notifications. Vectors and centroids are saved on exit and
+    reused on the next start for profiles whose food list is unchanged.
+    Profiles indexed before all their items were embedded are re-vectorized
+    on the next search after new item embeddings arrive.
+    """
+
+    def __init__(self, embedder=None, path=ANN_INDEX_PATH, candidates=ANN_CANDIDATES,
+                 nprobe=ANN_NPROBE, min_train=ANN_MIN_TRAIN):
+        self.vectorize = TasteVectorizer(embedder)
+        self.index = IVFIndex(self.vectorize.dim, nprobe, min_train)
+        self.path = path
+        self.candidates = candidates
+        self._versions = {}     # key -> profile_version of the indexed profile
+        self._pending = None    # key -> profile while attaching
+        self._unembedded = {}   # key -> food list whose vector lacks item embeddings
+        self._embedded_seen = self._embedded_count()
+        self.searches = 0
+
+    def attach(self, store):
+        """Index every profile in `store` and follow its future changes"""
+        self._pending = {}
+        store.subscribe(self.update)
+        pending, self._pending = self._pending, None
+        self.build(pending, self._load())
+        if self.path is not None:
+            atexit.register(self.save)
+        return self
+
+    def __len__(self):
+        return len(self.index)
+
+    # ----------------------------------------
+    # Maintenance
+    # ----------------------------------------
+    def _embedded_count(self):
+        embedder = self.vectorize.embedder
+        return embedder.embedded if embedder is not None else 0
+
+    def _track(self, key, food_choices, complete=None):
+        """Remember whether `key`'s vector includes every item embedding"""
+        if complete is None:
+            complete = self.vectorize.embedded(food_choices)
+        if complete:
+            self._unembedded.pop(key, None)
+        else:
+            self._unembedded[key] = food_choices
+
+    def _refresh_embeddings(self):
+        """Re-vectorize profiles with missing item embeddings once new ones arrived"""
+        embedded = self._embedded_count()
+        if not self._unembedded or embedded == self._embedded_seen:
+            return
+        self._embedded_seen = embedded
+        with self.index.lock:
+            for key, foods in list(self._unembedded.items()):
+                if self.vectorize.embedded(foods):
+                    self.index.add(key, self.vectorize(foods))
+                    del self._unembedded[key]
+
+    def update(self, key, user):
+        """Add, refresh or (when `user` is None) remove one profile"""
+        if self._pending is not None:
+            self._pending[key] = user
+            return
+        with self.index.lock:
+            if not valid_profile(user):
+                self._versions.pop(key, None)
+                self._unembedded.pop(key, None)
+                self.index.remove(key)
+                return
+            version = profile_version(user)
+            if self._versions.get(key) != version:
+                self._versions[key] = version
+                foods = user.get("foodChoices", [])
+                self.index.add(key, self.vectorize(foods))
+                self._track(key, foods)
+
+    def build(self, profiles, saved=None):
+        """
+        Index {key: profile} in one go, training once at the end. `saved`
+        ({key: (version, vector, complete)}, centroids) reuses vectors of
+        unchanged profiles and the saved clustering.
+        """
+        saved_vectors, centroids = saved or ({}, None)
+        index = self.index
+        with index.lock:
+            min_train, index.min_train = index.min_train, float("inf")
+            reused = 0
+            for key, user in profiles.items():
+                if not valid_profile(user):
+                    continue
+                version = profile_version(user)
+                foods = user.get("foodChoices", [])
+                old = saved_vectors.get(key)
+                if old is not None and old[0] == version:
+                    vector, complete = old[1], old[2]
+                    reused += 1
+                else:
+                    vector, complete = self.vectorize(foods), None
+                self._versions[key] = version
+                index.add(key, vector)
+                self._track(key, foods, complete)
+            index.min_train = min_train
+            if len(index) >= min_train:
+                index.train(centroids)
+        print(f"🧭 Taste index: {len(index)} profiles "
+              f"({reused} vectors reused), {len(index._lists) or 'no'} clusters")
+
+    # ----------------------------------------
+    # Persistence
+    # ----------------------------------------
+    def _load(self):
+        if self.path is None or not self.path.exists():
+            return None
+        try:
+            with np.load(self.path, allow_pickle=False) as saved:
+                meta = json.loads(str(saved["meta"]))
+                if meta != {"dim": self.vectorize.dim, **self.vectorize.signature()}:
+                    return None
+                vectors = dict(zip(saved["keys"].tolist(),
+                                   zip(saved["versions"].tolist(), saved["vectors"],
+                                       saved["complete"].tolist())))
+                centroids = saved["centroids"] if len(saved["centroids"]) else None
+            return vectors, centroids
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Ignoring unreadable taste index {self.path}: {e}")
+            return None
+
+    def save(self):
+        """Write vectors, versions and centroids (atomically)"""
+        if self.path is None:
+            return
+        index = self.index
+        with index.lock:
+            keys = [key for key in index.keys if key is not None]
+            rows = [index._slots[key] for key in keys]
+            data = {
+                "meta": np.array(json.dumps(
+                    {"dim": self.vectorize.dim, **self.vectorize.signature()})),
+                "keys": np.array(keys, dtype=str),
+                "versions": np.array([self._versions[key] for key in keys], dtype=str),
+                "vectors": index.vectors[rows],
+                "complete": np.array([key not in self._unembedded for key in keys], dtype=bool),
+                "centroids": (index.centroids if index.centroids is not None
+                              else np.zeros((0, index.dim), dtype=np.float32)),
+            }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix=".npz.tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **data)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    # ----------------------------------------
+    # Queries
+    # ----------------------------------------
+    def search(self, user, count=None, nprobe=None):
+        """
+        Keys of the profiles nearest to `user`'s taste (may include the
+        user), or None while the index is unclustered and an exact scan
+        is cheaper
+        """
+        self._refresh_embeddings()
+        if self.index.centroids is None:
+            return None
+        self.searches += 1
+        vector = self.vectorize(user.get("foodChoices", []))
+        return self.index.search(vector, count or self.candidates, nprobe)
+
+    def stats(self):
+        index = self.index
+        with index.lock:
+            return {
+                "profiles": len(index),
+                "clusters": len(index._lists),
+                "trainedSize": index.trained_size,
+                "searches": self.searches,
+            }
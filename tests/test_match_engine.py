@@ -0,0 +1,119 @@
+# tests/test_match_engine.py
+"""
+Differential tests for the single-pass keyword matcher and the batch scorer
+MultiPatternMatcher and detect_keywords must give exactly the result of the
+plain `p in text` loops they replaced, on a seeded corpus of food texts
+with partial words, multi-word keywords and overlapping patterns;
+score_vector must agree with score_pair while a FeatureMatrix is updated.
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from match_engine import (
+    CUISINE_KEYWORDS,
+    GENERAL_KEYWORDS,
+    FeatureMatrix,
+    MultiPatternMatcher,
+    detect_keywords,
+    score_pair,
+    score_vector,
+)
+
+KEYWORDS = [w for words in CUISINE_KEYWORDS.values() for w in words] + GENERAL_KEYWORDS
+
+# Pieces texts are built from: whole keywords, keyword fragments, words
+# that contain or extend keywords, and filler
+FRAGMENTS = KEYWORDS + list(CUISINE_KEYWORDS) + [
+    "ph", "pho bo", "phone", "bun", "beef noodle soup", "noodle", "curryish",
+    "fried rice", "friedchicken", "kimch", "sushirrito", "ramen-ish", "bbqq",
+    "mac and", "and cheese", "spice", "sweetcorn", "taco", "pad", "thai",
+    "a", "the", "with", "extra", "food", "cuisine", "", " ", "-",
+]
+
+
+def reference_findall(patterns, text):
+    """The original implementation: one substring test per pattern"""
+    return {p for p in set(patterns) if p in text}
+
+
+def reference_detect_keywords(text):
+    """The original cuisine/general keyword loops"""
+    cuisines = {c for c, words in CUISINE_KEYWORDS.items() if any(w in text for w in words)}
+    keywords = {kw for kw in GENERAL_KEYWORDS if kw in text}
+    return cuisines, keywords
+
+
+def corpus(size=5000, seed=1234):
+    rng = random.Random(seed)
+    texts = ["", "pho", "pho bo ga", "beef noodle soup", "mac and cheese", "korean bbq"]
+    for _ in range(size):
+        parts = rng.choices(FRAGMENTS, k=rng.randint(1, 6))
+        sep = rng.choice([" ", ", ", "", " and "])
+        texts.append(sep.join(parts).lower())
+    return texts
+
+
+def test_findall_matches_substring_loop_on_food_corpus():
+    matcher = MultiPatternMatcher(KEYWORDS)
+    for text in corpus():
+        assert matcher.findall(text) == reference_findall(KEYWORDS, text), text
+
+
+def test_search_matches_any_substring():
+    matcher = MultiPatternMatcher(CUISINE_KEYWORDS)
+    for text in corpus(1000, seed=99):
+        assert matcher.search(text) == any(c in text for c in CUISINE_KEYWORDS), text
+
+
+def test_findall_overlapping_and_nested_patterns():
+    # Patterns that are prefixes, suffixes and infixes of each other
+    patterns = ["a", "ab", "abc", "bc", "c", "he", "she", "his", "hers",
+                "pho", "pho bo", "pho ga", "o b", "fried", "fried rice", "rice"]
+    rng = random.Random(7)
+    alphabet = "abcehirsopfdg "
+    texts = ["ushers", "abcabc", "pho bo", "pho ga fried rice", "friedrice"]
+    texts += ["".join(rng.choices(alphabet, k=rng.randint(0, 20))) for _ in range(5000)]
+    matcher = MultiPatternMatcher(patterns)
+    for text in texts:
+        assert matcher.findall(text) == reference_findall(patterns, text), text
+
+
+def test_detect_keywords_matches_original_loops():
+    for text in corpus(seed=4321):
+        assert detect_keywords(text) == reference_detect_keywords(text), text
+
+
+def test_score_vector_matches_score_pair_through_updates():
+    rng = random.Random(2024)
+    matrix = FeatureMatrix()
+    profiles = {}
+    for step in range(3000):
+        key = rng.randrange(300)
+        if rng.random() < 0.15:
+            profiles.pop(key, None)
+            matrix.update(key, None)
+            continue
+        # Mostly short lists, now and then a very long one
+        count = rng.choice([0, 1, 3, 8, 20]) if rng.random() < 0.98 else 2000
+        foods = rng.choices(FRAGMENTS, k=count) + [f"dish {rng.randrange(500)}"]
+        profiles[key] = {"name": f"user{key}", "foodChoices": foods}
+        matrix.update(key, profiles[key])
+
+        if step % 100 == 0:
+            user = {"name": "probe", "foodChoices": rng.choices(FRAGMENTS, k=6)}
+            scores = score_vector(user, matrix)
+            for k, other in profiles.items():
+                assert scores[matrix.row_of(k)] == score_pair(user, other)["score"]
+            rows = rng.sample([matrix.row_of(k) for k in profiles], min(20, len(profiles)))
+            subset = score_vector(user, matrix, rows)
+            for row in range(len(subset)):
+                assert subset[row] == (scores[row] if row in rows else -1)
+
+    # Long lists don't widen the other rows
+    assert matrix._flat_len <= 2 * int(matrix.sizes.sum()) + 4096
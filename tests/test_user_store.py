@@ -0,0 +1,86 @@
+# tests/test_user_store.py
+"""
+Tests for the delayed (save_later) profile writes: a flush must compare
+"Z"-suffixed and naive lastUpdated values without failing, and never
+replace a profile another process updated later.
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+import json
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from user_store import JSONUserStore, SQLiteUserStore, _is_newer, user_filename
+
+
+def profile(updated, foods):
+    return {"name": "Sowmiya", "foodChoices": foods, "lastUpdated": updated}
+
+
+def test_is_newer_mixes_utc_and_naive_timestamps():
+    stored = profile("2025-11-22T10:42:00Z", ["pho"])
+    assert not _is_newer(stored, profile(datetime.now().isoformat(), ["ramen"]))
+    assert _is_newer(stored, profile("2020-01-01T00:00:00", ["ramen"]))
+    assert not _is_newer(profile("not a date", []), profile("2020-01-01T00:00:00", []))
+
+
+def test_json_flush_writes_naive_update_over_utc_profile(tmp_path):
+    path = tmp_path / user_filename("Sowmiya")
+    path.write_text(json.dumps(profile("2025-11-22T10:42:00Z", ["pho"])))
+    store = JSONUserStore(str(tmp_path))
+    store.coalesce_seconds = 60
+    store.save_later(profile(datetime.now().isoformat(), ["ramen"]))
+    store.flush()
+    assert json.loads(path.read_text())["foodChoices"] == ["ramen"]
+    assert store.writes == 1
+
+
+def test_sqlite_flush_keeps_newer_utc_profile(tmp_path):
+    later = (datetime.now() + timedelta(days=1)).astimezone().isoformat()
+    other = SQLiteUserStore(tmp_path / "users.sqlite3")
+    other.save(profile(later.replace("+00:00", "Z"), ["pho"]))
+    store = SQLiteUserStore(tmp_path / "users.sqlite3")
+    store.coalesce_seconds = 60
+    store.save_later(profile(datetime.now().isoformat(), ["ramen"]))
+    store.flush()
+    assert store.get("Sowmiya")["foodChoices"] == ["pho"]
+
+
+def test_json_flush_keeps_newer_profile_in_cache(tmp_path):
+    later = (datetime.now() + timedelta(days=1)).isoformat()
+    path = tmp_path / user_filename("Sowmiya")
+    path.write_text(json.dumps(profile(later, ["pho"])))
+    store = JSONUserStore(str(tmp_path))
+    store.coalesce_seconds = 60
+    store.save_later(profile(datetime.now().isoformat(), ["ramen"]))
+    store.flush()
+    assert json.loads(path.read_text())["foodChoices"] == ["pho"]
+    assert store.get("Sowmiya")["foodChoices"] == ["pho"]
+
+
+def test_failed_flush_keeps_profiles_pending(tmp_path):
+    store = JSONUserStore(str(tmp_path))
+    store.coalesce_seconds = 60
+    store.save_later(profile(datetime.now().isoformat(), ["ramen"]))
+    persist, calls = store._persist, []
+
+    def failing(profiles, newer_only=False):
+        calls.append(len(profiles))
+        raise OSError("disk full")
+
+    store._persist = failing
+    try:
+        store.flush()
+    except OSError:
+        pass
+    assert calls == [1] and len(store._pending) == 1
+    assert store._flush_timer is not None  # retry scheduled
+
+    store._persist = persist
+    store.flush()
+    assert not store._pending
+    assert json.loads((tmp_path / user_filename("Sowmiya")).read_text())["foodChoices"] == ["ramen"]
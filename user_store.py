@@ -0,0 +1,616 @@
+# user_store.py
+"""
+Process-wide in-memory user stores for Food-Friend
+UserStore is the interface; JSONUserStore keeps one file per user under
+data/users (re-reading only files whose mtime/size changed) and
+SQLiteUserStore keeps every profile in one indexed SQLite database
+"""
+
+import os
+import json
+import time
+import atexit
+import bisect
+import hashlib
+import secrets
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime, timezone
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process lock applies
+    fcntl = None
+
+from config import (
+    USER_DATA_DIR,
+    USER_STORE_RESCAN_INTERVAL,
+    USER_STORE_BACKEND,
+    USER_DB_PATH,
+    USER_WRITE_COALESCE_SECONDS,
+)
+
+
+def user_filename(name):
+    """File name (not path) used for a user's profile"""
+    safe = name.replace(" ", "_").lower()
+    return f"user_{safe}.json"
+
+
+def user_key(name):
+    """
+    Key identifying a user's profile in every backend and in store
+    notifications (the JSON backend's file name)
+    """
+    return user_filename(name)
+
+
+def _updated_at(data):
+    """
+    A profile's lastUpdated as an aware UTC datetime, or None if
+    missing/unparseable. Naive values (the server's datetime.now()) are
+    local time; "Z"/offset values are converted.
+    """
+    try:
+        at = datetime.fromisoformat(data["lastUpdated"].replace("Z", "+00:00"))
+    except (TypeError, KeyError, ValueError, AttributeError):
+        return None
+    try:
+        return at.astimezone(timezone.utc)
+    except (OverflowError, OSError, ValueError):
+        return None
+
+
+def _is_newer(stored, data):
+    """True if the stored profile was updated after `data`"""
+    if stored is None:
+        return False
+    stored_at, data_at = _updated_at(stored), _updated_at(data)
+    return stored_at is not None and data_at is not None and stored_at > data_at
+
+
+def _copy_profile(data):
+    """Copy a profile so callers can't mutate cached state"""
+    data = dict(data)
+    if isinstance(data.get("foodChoices"), list):
+        data["foodChoices"] = list(data["foodChoices"])
+    return data
+
+
+class UserStore:
+    """
+    Interface of a cached user profile store.
+
+    Backends keep every profile in memory as {user_key: data or None} and
+    implement refresh() (pick up external changes) and _persist() (write
+    profiles out). `generation` is bumped whenever the cached population
+    changes, so callers can cheaply tell whether anything derived from the
+    users is stale. `version` fingerprints the stored data itself (backend
+    `epoch` + `_state()`), so every process that sees the same profiles,
+    e.g. each server worker, computes the same version.
+    """
+
+    def __init__(self, rescan_interval=USER_STORE_RESCAN_INTERVAL,
+                 coalesce_seconds=USER_WRITE_COALESCE_SECONDS):
+        self.rescan_interval = rescan_interval
+        self.coalesce_seconds = coalesce_seconds
+        self.generation = 0
+        self.epoch = None  # identifies the underlying data; set by backends
+        self.writes = 0
+        self.coalesced = 0
+        self._profiles = {}  # user_key -> data or None (unparseable)
+        self._pending = {}   # user_key -> data saved but not yet written
+        self._flush_timer = None
+        self._last_scan = None
+        self._order = (None, [])  # (generation, sorted keys)
+        self._version = (None, None)  # (generation, version)
+        self._listeners = []
+        self._lock = threading.RLock()
+        atexit.register(self.flush)
+
+    # ----------------------------------------
+    # Change notification
+    # ----------------------------------------
+    def subscribe(self, listener):
+        """
+        Register `listener(key, data)` to be called for every profile change,
+        replaying the current population to it first. `key` is the profile's
+        user_key; `data` is None when it was removed or can no longer be
+        parsed. Listeners run under the store lock and must not mutate `data`.
+        The replay itself runs outside the lock, so a large population
+        doesn't block readers meanwhile; changes made during the replay are
+        delivered after it, in order.
+        """
+        self.refresh()
+        buffered = []
+        replaying = True
+        guard = threading.Lock()
+
+        def deliver(key, data):
+            with guard:
+                if replaying:
+                    buffered.append((key, data))
+                    return
+            listener(key, data)
+
+        with self._lock:
+            snapshot = list(self._profiles.items())
+            self._listeners.append(deliver)
+        for key, data in snapshot:
+            listener(key, data)
+        while True:
+            with guard:
+                changes, buffered[:] = list(buffered), []
+                if not changes:
+                    replaying = False
+                    break
+            for key, data in changes:
+                listener(key, data)
+
+    def _notify(self, key, data):
+        for listener in self._listeners:
+            listener(key, data)
+
+    def _due(self, force):
+        """True when a rescan is forced or the rescan interval has passed"""
+        now = time.monotonic()
+        if (not force and self._last_scan is not None
+                and now - self._last_scan < self.rescan_interval):
+            return False
+        self._last_scan = now
+        return True
+
+    # ----------------------------------------
+    # Backend hooks
+    # ----------------------------------------
+    def refresh(self, force=False):
+        """Pick up changes made outside this process"""
+        raise NotImplementedError
+
+    def _state(self):
+        """Fingerprint of the persisted profiles this process has loaded"""
+        raise NotImplementedError
+
+    def _persist(self, profiles, newer_only=False):
+        """
+        Durably write `profiles` (called with the store lock held). With
+        `newer_only`, a profile whose stored copy has a later lastUpdated
+        (written meanwhile by another process) is skipped and that copy
+        cached instead. Returns the number of profiles written.
+        """
+        raise NotImplementedError
+
+    # ----------------------------------------
+    # Writes
+    # ----------------------------------------
+    def _keep_stored(self, key, stored):
+        """Cache the newer stored profile a delayed write was skipped for"""
+        self._profiles[key] = stored
+        self._notify(key, stored)
+        self.generation += 1
+
+    def _cache(self, data):
+        key = user_key(data["name"])
+        cached = _copy_profile(data)
+        self._profiles[key] = cached
+        self._notify(key, cached)
+        return key, cached
+
+    def save(self, data):
+        """Write a profile and update the cache in place"""
+        self.save_many([data])
+
+    def save_many(self, profiles):
+        """Write several profiles and update the cache in place"""
+        profiles = list(profiles)
+        if not profiles:
+            return
+        with self._lock:
+            for data in profiles:
+                self._pending.pop(user_key(data["name"]), None)
+            self.writes += self._persist(profiles)
+            for data in profiles:
+                self._cache(data)
+            self.generation += 1
+
+    def save_later(self, data):
+        """
+        Update the cache (and listeners) now but write the profile after
+        coalesce_seconds. Saves of the same user within that window replace
+        the pending one, so a burst of edits costs a single write. Another
+        process (e.g. a second server worker) may save the same user in the
+        meantime; the delayed write never replaces a newer profile.
+        """
+        if self.coalesce_seconds <= 0:
+            return self.save(data)
+        with self._lock:
+            key, cached = self._cache(data)
+            if key in self._pending:
+                self.coalesced += 1
+            self._pending[key] = cached
+            self.generation += 1
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.coalesce_seconds, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def flush(self):
+        """
+        Write every pending save_later() profile now. Profiles stay pending
+        until the write succeeds; a failed write is logged, retried after
+        coalesce_seconds and re-raised.
+        """
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._pending:
+                return
+            try:
+                self.writes += self._persist(list(self._pending.values()), newer_only=True)
+            except Exception as e:
+                print(f"❌ Failed to write {len(self._pending)} pending profile(s), "
+                      f"retrying in {self.coalesce_seconds}s: {e}")
+                self._schedule_flush()
+                raise
+            self._pending.clear()
+            self._version = (None, None)  # written now, no longer pending
+
+    # ----------------------------------------
+    # Queries
+    # ----------------------------------------
+    @property
+    def version(self):
+        """
+        Short token for the current population, recomputed once per
+        generation; profiles saved but not yet written are part of it
+        """
+        with self._lock:
+            generation, version = self._version
+            if generation != self.generation:
+                pending = sorted(
+                    (key, json.dumps(data, sort_keys=True)) for key, data in self._pending.items())
+                raw = json.dumps([self.epoch, self._state(), pending])
+                version = hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+                self._version = (self.generation, version)
+            return version
+
+    def __len__(self):
+        """Number of stored profiles, including unreadable ones"""
+        with self._lock:
+            return len(self._profiles)
+
+    def get(self, name):
+        """Return a copy of the user's profile, or None if it doesn't exist"""
+        self.refresh()
+        with self._lock:
+            data = self._profiles.get(user_key(name))
+        if data is None:
+            return None
+        return _copy_profile(data)
+
+    def all_users(self, exclude=None):
+        """
+        Return all valid profiles except `exclude`.
+        The returned dicts are shared with the cache and must not be mutated.
+        """
+        self.refresh()
+        exclude = exclude.lower() if exclude else None
+        users = []
+        with self._lock:
+            for data in self._profiles.values():
+                if data is None or "name" not in data:
+                    continue
+                if exclude and data["name"].lower() == exclude:
+                    continue
+                data.setdefault("foodChoices", [])
+                users.append(data)
+        return users
+
+    def _sorted_keys(self):
+        """Profile keys in order, re-sorted once per generation"""
+        generation, keys = self._order
+        if generation != self.generation:
+            keys = sorted(self._profiles)
+            self._order = (self.generation, keys)
+        return keys
+
+    def page(self, after=None, limit=None):
+        """
+        Valid profiles ordered by key, starting after user `after` (a name),
+        at most `limit` of them. Returns (profiles, cursor): cursor is the
+        last returned name when more profiles follow, else None. The dicts
+        are shared with the cache and must not be mutated.
+        """
+        self.refresh()
+        users = []
+        with self._lock:
+            keys = self._sorted_keys()
+            start = bisect.bisect_right(keys, user_key(after)) if after else 0
+            for i in range(start, len(keys)):
+                data = self._profiles.get(keys[i])
+                if data is None or "name" not in data:
+                    continue
+                if limit is not None and len(users) >= limit:
+                    return users, users[-1]["name"] if users else after
+                data.setdefault("foodChoices", [])
+                users.append(data)
+        return users, None
+
+
+class JSONUserStore(UserStore):
+    """
+    One JSON file per user in a data directory.
+
+    Each file is tracked with its (mtime_ns, size) signature so a re-scan only
+    parses files that were added or changed.
+    """
+
+    def __init__(self, data_dir=USER_DATA_DIR, rescan_interval=USER_STORE_RESCAN_INTERVAL):
+        super().__init__(rescan_interval)
+        self.data_dir = data_dir
+        self._sigs = {}  # fname -> (mtime_ns, size)
+        self._sigs_digest = 0  # XOR of every file's signature hash
+        os.makedirs(data_dir, exist_ok=True)
+        self._lock_path = os.path.join(data_dir, ".lock")
+        st = os.stat(data_dir)
+        self.epoch = f"{st.st_dev}:{st.st_ino}"
+
+    @staticmethod
+    def _sig_hash(fname, sig):
+        raw = f"{fname}:{sig[0]}:{sig[1]}".encode("utf-8")
+        return int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "big")
+
+    def _set_sig(self, fname, sig):
+        """Record (or with sig None, forget) a file's signature"""
+        old = self._sigs.pop(fname, None)
+        if old is not None:
+            self._sigs_digest ^= self._sig_hash(fname, old)
+        if sig is not None:
+            self._sigs[fname] = sig
+            self._sigs_digest ^= self._sig_hash(fname, sig)
+
+    def _state(self):
+        """Files and their (mtime, size) signatures, kept as a running hash"""
+        return [len(self._sigs), self._sigs_digest]
+
+    def _read(self, path):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, dict):
+            return None
+        return data
+
+    def refresh(self, force=False):
+        """Re-scan the directory, re-reading only new or modified files"""
+        with self._lock:
+            if not self._due(force):
+                return
+
+            changed = False
+            seen = set()
+            with os.scandir(self.data_dir) as it:
+                for entry in it:
+                    if not entry.name.endswith(".json"):
+                        continue
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    seen.add(entry.name)
+                    sig = (st.st_mtime_ns, st.st_size)
+                    if self._sigs.get(entry.name) == sig or entry.name in self._pending:
+                        continue
+                    data = self._read(entry.path)
+                    if data is None and self._profiles.get(entry.name) is not None:
+                        # Keep the last good version; retry on the next scan
+                        continue
+                    self._set_sig(entry.name, sig)
+                    self._profiles[entry.name] = data
+                    self._notify(entry.name, data)
+                    changed = True
+
+            for fname in list(self._profiles):
+                if fname not in seen and fname not in self._pending:
+                    del self._profiles[fname]
+                    self._set_sig(fname, None)
+                    self._notify(fname, None)
+                    changed = True
+
+            if changed:
+                self.generation += 1
+
+    @contextmanager
+    def _file_lock(self):
+        """Advisory lock serializing writers across processes"""
+        if fcntl is None:
+            yield
+            return
+        with open(self._lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _write_file(self, path, data):
+        """
+        Write to a temp file in the same directory, fsync it, then rename it
+        over `path`: readers see the old or the new profile, never a
+        truncated one
+        """
+        fd, tmp = tempfile.mkstemp(dir=self.data_dir, prefix=".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def _persist(self, profiles, newer_only=False):
+        """Atomically write each profile's file under the advisory lock"""
+        written = 0
+        with self._file_lock():
+            for data in profiles:
+                fname = user_filename(data["name"])
+                path = os.path.join(self.data_dir, fname)
+                if newer_only:
+                    stored = self._read(path)
+                    if _is_newer(stored, data):
+                        st = os.stat(path)
+                        self._set_sig(fname, (st.st_mtime_ns, st.st_size))
+                        self._keep_stored(fname, stored)
+                        continue
+                self._write_file(path, data)
+                st = os.stat(path)
+                self._set_sig(fname, (st.st_mtime_ns, st.st_size))
+                written += 1
+        return written
+
+
+class SQLiteUserStore(UserStore):
+    """
+    Every profile as a JSON row in one SQLite database (WAL mode), keyed and
+    indexed by user_key. Profiles are bulk-read once; afterwards a rescan
+    only reads rows whose revision is newer than the last one seen, and only
+    when PRAGMA data_version says another connection committed.
+    """
+
+    def __init__(self, path=USER_DB_PATH, rescan_interval=USER_STORE_RESCAN_INTERVAL):
+        super().__init__(rescan_interval)
+        self.path = path
+        self._rev = 0               # highest revision loaded
+        self._data_version = None
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS users (
+                   key TEXT PRIMARY KEY,
+                   name TEXT NOT NULL,
+                   data TEXT NOT NULL,
+                   rev INTEGER NOT NULL
+               )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS users_rev ON users (rev)")
+        # Random ID created with the database, shared by every connection
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._db.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('epoch', ?)",
+                         (secrets.token_hex(8),))
+        self._db.commit()
+        self.epoch = self._db.execute("SELECT value FROM meta WHERE key = 'epoch'").fetchone()[0]
+
+    def _state(self):
+        """Highest revision loaded and row count (deletes don't add revisions)"""
+        return [self._rev, len(self._profiles)]
+
+    def refresh(self, force=False):
+        """Load rows written by other connections since the last refresh"""
+        with self._lock:
+            if self._due(force):
+                self._sync(force)
+
+    def _sync(self, force=False):
+        # data_version only changes when another connection commits
+        data_version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version and not force:
+            return
+        self._data_version = data_version
+
+        changed = False
+        rows = self._db.execute(
+            "SELECT key, data, rev FROM users WHERE rev > ? ORDER BY rev", (self._rev,))
+        for key, text, rev in rows.fetchall():
+            try:
+                data = json.loads(text)
+            except ValueError:
+                data = None
+            self._rev = rev
+            if key in self._pending:
+                continue
+            self._profiles[key] = data
+            self._notify(key, data)
+            changed = True
+
+        keys = {key for key, in self._db.execute("SELECT key FROM users")}
+        for key in list(self._profiles):
+            if key not in keys and key not in self._pending:
+                del self._profiles[key]
+                self._notify(key, None)
+                changed = True
+
+        if changed:
+            self.generation += 1
+
+    def _persist(self, profiles, newer_only=False):
+        """Upsert the profiles' rows in one transaction"""
+        # Take the write lock first, then catch up with other writers so
+        # the new revisions follow every row already loaded
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            self._sync()
+            rows = []
+            for data in profiles:
+                key = user_key(data["name"])
+                if newer_only:
+                    row = self._db.execute(
+                        "SELECT data FROM users WHERE key = ?", (key,)).fetchone()
+                    try:
+                        stored = json.loads(row[0]) if row else None
+                    except ValueError:
+                        stored = None
+                    if _is_newer(stored, data):
+                        self._keep_stored(key, stored)
+                        continue
+                self._rev += 1
+                rows.append((key, data["name"],
+                             json.dumps(data, ensure_ascii=False), self._rev))
+            self._db.executemany(
+                "INSERT INTO users (key, name, data, rev) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET name = excluded.name, "
+                "data = excluded.data, rev = excluded.rev",
+                rows,
+            )
+            self._db.commit()
+        except BaseException:
+            self._db.rollback()
+            raise
+        return len(rows)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_user_store(backend=USER_STORE_BACKEND):
+    """
+    Process-wide store for the configured backend ("json" reads
+    USER_DATA_DIR, "sqlite" reads USER_DB_PATH); one instance per backend
+    """
+    with _stores_lock:
+        store = _stores.get(backend)
+        if store is None:
+            if backend == "json":
+                store = JSONUserStore()
+            elif backend == "sqlite":
+                store = SQLiteUserStore()
+            else:
+                raise ValueError(f"Unknown user store backend: {backend!r}")
+            _stores[backend] = store
+        return store